@@ -1,5 +1,6 @@
 from typing import Optional, Union, Dict
 import gzip
+import io
 import threading
 import json
 import logging
@@ -135,9 +136,15 @@ class PyPipeGraph:
         # self.paths = {k: Path(v) for (k, v) in paths} if paths else {}
         self.run_mode = run_mode
         self.jobs = {}  # the job objects, by id
-        self.job_dag = (
+        self._job_dag = (
             networkx.DiGraph()
         )  # a graph. Nodes: job_ids, edges -> must be done before
+        # edges are collected here and handed to networkx in bulk
+        # whenever somebody actually looks at job_dag. A dict for an ordered set.
+        self._pending_edges = {}
+        # bumped whenever a job or edge is added - see topological_levels()
+        self._dag_generation = 0
+        self._topology_cache = None
         self.job_inputs = collections.defaultdict(
             set
         )  # necessary inputs (ie. outputs of other jobs)
@@ -154,8 +161,11 @@ class PyPipeGraph:
         self.next_job_number = 0
         self.next_job_number_lock = threading.Lock()
         self._path_cache = {}
+        self._resolved_dir_cache = {}
         self.report_done_filter = report_done_filter
         self.func_cache = {}
+        self._source_file_cache = {}
+        self._cython_module_cache = {}
         self.dir_absolute = Path(".").absolute()
         self._jobs_do_dump_subgraph_debug = False
         self._jobs_to_prune_unrelated = False
@@ -199,12 +209,9 @@ class PyPipeGraph:
         )  # include subsecond in log names - usefull for the testing, I suppose.
         ts = ts[ts.rfind(".") :]
         self.time_str = datetime.datetime.now().strftime(time_format) + ts
-        if not networkx.algorithms.is_directed_acyclic_graph(self.job_dag):
+        if self.topological_levels() is None:
             print(networkx.readwrite.json_graph.node_link_data(self.job_dag))
             raise exceptions.NotADag()
-        else:
-            # print(networkx.readwrite.json_graph.node_link_data(self.job_dag))
-            pass
         start_time = time.time()
         self._resolve_dependency_callbacks()
         self.running = True  # must happen after dependency callbacks
@@ -290,6 +297,9 @@ class PyPipeGraph:
                 log_error(f"{e}")
                 raise exceptions.HistoryLoadingFailed(e)
             max_runs = 5
+            # enum member lookups are comparatively slow - hoist it
+            # out of the per-job loops below, and compare by identity.
+            outcome_failed = JobOutcome.Failed
             jobs_already_run = set()
             final_result = {}
             aborted = False
@@ -333,7 +343,7 @@ class PyPipeGraph:
                     for k, v in result.items():
                         if (
                             not k in final_result
-                            or final_result[k].outcome != JobOutcome.Failed
+                            or final_result[k].outcome is not outcome_failed
                         ):
                             final_result[k] = v
                     # final_result.update(result)
@@ -350,7 +360,7 @@ class PyPipeGraph:
             log_debug(f"Left graph loop. Final result len {len(final_result)}")
             jobs_failed = False
             for job_id, job_state in final_result.items():
-                if job_state.outcome == JobOutcome.Failed:
+                if job_state.outcome is outcome_failed:
                     self.do_raise.append(job_state.payload)
                     jobs_failed = True
             self.last_run_result = final_result
@@ -485,8 +495,10 @@ class PyPipeGraph:
         history = {}
         if fn.exists():
             log_trace("Historical existed")
+            # json.loads takes the utf-8 bytes directly,
+            # no need for a decoded copy of the whole (possibly huge) history
             with gzip.GzipFile(fn, "rb") as op:
-                history = json.loads(op.read().decode("utf-8"))
+                history = json.loads(op.read())
 
         log_debug(f"Loaded {len(history)} history entries")
         return history
@@ -500,9 +512,13 @@ class PyPipeGraph:
 
         try_again = True
         while try_again:
-            with gzip.GzipFile(fn, "wb") as op:
+            # compresslevel 6 is about twice as fast as the default 9
+            # for a <1% larger file, and the history is written after every run.
+            # No indent: the values are json strings themselves,
+            # pretty printing the outer dict only costs time and space.
+            with gzip.GzipFile(fn, "wb", compresslevel=6) as op:
                 try:
-                    op.write(json.dumps(historical, indent=2).encode("utf-8"))
+                    op.write(json.dumps(historical).encode("utf-8"))
                     if self._test_failing_outside_of_job:  # for unit test
                         self._test_failing_outside_of_job = False
                         log_error("keyboard interrupt raised in loop")
@@ -554,8 +570,7 @@ class PyPipeGraph:
         # for job_id in self.jobs.keys():
         # new[job_id] = json.dumps(old[job_id], indent=2)
 
-        for job_id, job in self.jobs.items():
-            upstreams = job.upstreams
+        for job_id in self.jobs:
             # incoming_edges = sorted([x.job_id for x in upstreams])
             # "\n".join(incoming_edges)
             new[job_id + "!!!"] = Runner.get_job_inputs_str(self, job_id)
@@ -587,12 +602,17 @@ class PyPipeGraph:
 
     @staticmethod
     def _load_old_history(path):
-        with gzip.GzipFile(Path(path)) as of:
+        # the ppg1 format is a stream of alternating key/value pickles.
+        # Read it through one unpickler on a buffered stream,
+        # instead of setting up a new unpickler (and doing tiny
+        # gzip reads) for every single object.
+        with io.BufferedReader(gzip.GzipFile(Path(path)), 1024 * 1024) as of:
             old = {}
+            load = pickle.Unpickler(of).load
             try:
                 while True:
-                    key = pickle.load(of)
-                    value = pickle.load(of)
+                    key = load()
+                    value = load()
                     if key in old:
                         raise KeyError()
                     old[key] = value
@@ -674,6 +694,15 @@ class PyPipeGraph:
         if hasattr(self, "_old_signal_int"):  # pragma: no branch
             signal.signal(signal.SIGINT, self._old_signal_int)
 
+    @property
+    def job_dag(self):
+        """The networkx.DiGraph of job_ids.
+        Nodes: job_ids, edges -> upstream must be done before downstream"""
+        if self._pending_edges:
+            self._job_dag.add_edges_from(self._pending_edges)
+            self._pending_edges.clear()
+        return self._job_dag
+
     def add(self, job):
         """Add a job.
         Automatically called when a Job() is created
@@ -713,7 +742,8 @@ class PyPipeGraph:
                 job.job_number = self.next_job_number
                 self.next_job_number += 1
         self.jobs[job.job_id] = job
-        self.job_dag.add_node(job.job_id)
+        self._job_dag.add_node(job.job_id)
+        self._dag_generation += 1
         # assert len(self.jobs) == len(self.job_dag) - we verify this when running
 
     def find_job_from_file(self, filename):
@@ -746,7 +776,26 @@ class PyPipeGraph:
                 f"{downstream_job} not in this graph. Call job.readd() first"
             )
 
-        self.job_dag.add_edge(upstream_job.job_id, downstream_job.job_id)
+        self._pending_edges[(upstream_job.job_id, downstream_job.job_id)] = None
+        self._dag_generation += 1
+
+    def topological_levels(self):
+        """util.topological_levels(job_dag), or None if there's a cycle.
+
+        Cached until the next job or edge is added. (Removing edges or jobs
+        leaves a topological order valid, the runner filters it to its dag anyway.)
+        So the check in _run and the one in the Runner share one pass,
+        and so do repeated runs of an unchanged graph.
+        """
+        if (
+            self._topology_cache is None
+            or self._topology_cache[0] != self._dag_generation
+        ):
+            self._topology_cache = (
+                self._dag_generation,
+                util.topological_levels(self.job_dag),
+            )
+        return self._topology_cache[1]
 
     def has_edge(self, upstream_job, downstream_job):
         """Does this edge already exist?"""
@@ -758,7 +807,12 @@ class PyPipeGraph:
             downstream_job_id = downstream_job.job_id
         else:
             downstream_job_id = downstream_job
-        return self.job_dag.has_edge(upstream_job_id, downstream_job_id)
+        return (
+            upstream_job_id,
+            downstream_job_id,
+        ) in self._pending_edges or self._job_dag.has_edge(
+            upstream_job_id, downstream_job_id
+        )
 
     def restart_afterwards(self):
         """Restart the whole python program afterwards?
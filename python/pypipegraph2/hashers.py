@@ -1,6 +1,45 @@
+import os
+import mmap
+import hashlib
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 from xxhash import xxh3_128
 
+_hash_pool = None
+
+# Pluggable backend, chosen by setting PPG_HASH.
+# Switching it changes every stored hash, so everything
+# is invalidated once, and SharedMultiFileGeneratingJobs are only
+# shared between projects using the same backend.
+backends = {
+    "xxh3_128": xxh3_128,
+    "sha256": hashlib.sha256,
+}
+try:
+    from blake3 import blake3
+
+    backends["blake3"] = blake3  # pragma: no cover - optional dependency
+except ImportError:
+    pass
+
+
+def _choose_backend():
+    name = os.environ.get("PPG_HASH", "xxh3_128")
+    if name not in backends:
+        raise ValueError(
+            f"Unknown (or not installed) PPG_HASH backend {name!r}. "
+            f"Available: {sorted(backends)}"
+        )
+    return backends[name]
+
+
+hasher_factory = _choose_backend()
+
+# files at least this large are hashed from a memory map
+# - no copying every block into a bytes object first
+_mmap_threshold = 64 * 1024 * 1024
+_mmap_block_size = 4 * 1024 * 1024
+
 
 def hash_file(path: Path):
     """delegate to a fast and somewhat collision resistant hash function"""
@@ -11,7 +50,8 @@ def hash_file(path: Path):
     # but the xxhash implementation releases the gil
     # when passed more than 100kb (otherwise it's a
     # faster *not* to acquire the lock!)
-    hasher = xxh3_128()
+    # (see PPG_HASH for alternatives)
+    hasher = hasher_factory()
     # if known_st_size is None:
     # known_st_size = path.stat().st_size
     # we are not acquiring the core lock here.
@@ -24,21 +64,59 @@ def hash_file(path: Path):
     # (except for memory bandwidth. oh well, at least
     # it should not go into swap with the tiny buffer we use here)
     with open(path, "rb") as op:
-        block = op.read(1024 * 512)
-        while block:
-            hasher.update(block)
+        # the file is open anyway - no need for another path lookup
+        stat = os.fstat(op.fileno())
+        if stat.st_size < _mmap_threshold or not _hash_mmaped(op, hasher):
             block = op.read(1024 * 512)
-    stat = path.stat()
+            while block:
+                hasher.update(block)
+                block = op.read(1024 * 512)
 
     return {
         "hash": hasher.hexdigest(),
-        "mtime": int(stat.st_mtime),
+        "mtime": int(stat.st_mtime),  # kept for older readers
+        "mtime_ns": stat.st_mtime_ns,
         "size": stat.st_size,
+        "ino": stat.st_ino,
     }
 
 
+def _hash_mmaped(op, hasher):
+    """Feed the hasher straight from a memory map of op.
+    Returns False if the file could not be mapped
+    (and nothing was hashed)
+    """
+    try:
+        mm = mmap.mmap(op.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):  # pragma: no cover - e.g. special files
+        return False
+    with mm:
+        if hasattr(mm, "madvise"):  # python >= 3.8
+            mm.madvise(mmap.MADV_SEQUENTIAL)
+        view = memoryview(mm)
+        try:
+            for start in range(0, len(mm), _mmap_block_size):
+                hasher.update(view[start : start + _mmap_block_size])
+        finally:
+            view.release()
+    return True
+
+
+def hash_files(paths):
+    """hash_file for many files at once.
+    Reading is I/O bound and xxhash releases the GIL on large blocks,
+    so a few threads overlap the disk latency nicely.
+    """
+    global _hash_pool
+    if len(paths) < 2:
+        return [hash_file(p) for p in paths]
+    if _hash_pool is None:
+        _hash_pool = ThreadPoolExecutor(max_workers=8)
+    return list(_hash_pool.map(hash_file, paths))
+
+
 def hash_bytes(input: bytes):
-    hasher = xxh3_128()
+    hasher = hasher_factory()
     hasher.update(input)
     return hasher.hexdigest()
 
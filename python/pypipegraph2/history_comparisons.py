@@ -10,19 +10,47 @@ import sys
 from . import ppg_traceback
 
 
+def parse_history(runner, str_history):
+    """json.loads, memoized per run.
+    An upstream's output string is compared once for each of it's downstreams"""
+    try:
+        return runner.parsed_history_cache[str_history]
+    except KeyError:
+        res = runner.parsed_history_cache[str_history] = json.loads(str_history)
+        return res
+
+
+def edge_outputs(runner, job_upstream, job_downstream_id):
+    """The upstream's outputs the downstream consumes, in output order.
+    Memoized per run - the edge is compared again for every changed history"""
+    key = (job_upstream.job_id, job_downstream_id)
+    try:
+        return runner.edge_outputs_cache[key]
+    except KeyError:
+        inputs = runner.job_inputs[job_downstream_id]
+        res = runner.edge_outputs_cache[key] = tuple(
+            ip for ip in job_upstream.outputs if ip in inputs
+        )
+        return res
+
+
 def history_is_different(runner, job_upstream_id, job_downstream_id, str_last, str_now):
     # note that at this point, we already know str_last != str_now,
     # that was tested in rust
     # log_error(f"history is maybe different {job_upstream_id} {job_downstream_id} {str_last == str_now}")
     job_upstream = runner.jobs[job_upstream_id]
-    obj_last = json.loads(str_last)
-    obj_now = json.loads(str_now)
+    compare_hashes = job_upstream.compare_hashes
+    obj_last = parse_history(runner, str_last)
+    obj_now = parse_history(runner, str_now)
+    # the common case is that most of the hashes are unchanged.
+    # compare_hashes is reflexive, so equal values don't need the method call.
     if job_downstream_id == "!!!":
         # special case where we compare a job to itself, not to the input it delivered into another job.
         # Has to do with ephemeral jobs not changing output when validated-but-rerun.
         outputs = job_upstream.outputs
         for ip in outputs:
-            altered = not job_upstream.compare_hashes(obj_last[ip], obj_now[ip])
+            old, new = obj_last[ip], obj_now[ip]
+            altered = old != new and not compare_hashes(old, new)
             if altered:
                 log_warning(
                     f"history is actually different for {job_upstream_id}-> !!! {obj_last[ip]} {obj_now[ip]}"
@@ -31,18 +59,16 @@ def history_is_different(runner, job_upstream_id, job_downstream_id, str_last, s
 
     else:
         try:
-            outputs = job_upstream.outputs
-            inputs = runner.job_inputs[job_downstream_id]
-            for ip in inputs:
-                if ip in outputs:
-                    altered = not job_upstream.compare_hashes(obj_last[ip], obj_now[ip])
-                    if altered:
-                        log_warning(
-                            "history is actually different for job-pair "
-                            + f"{job_upstream_id}->{job_downstream_id}: "
-                            + f"{obj_last[ip]} {obj_now[ip]}"
-                        )
-                        return True
+            # leaving at the first altered one
+            for ip in edge_outputs(runner, job_upstream, job_downstream_id):
+                old, new = obj_last[ip], obj_now[ip]
+                if old != new and not compare_hashes(old, new):
+                    log_warning(
+                        "history is actually different for job-pair "
+                        + f"{job_upstream_id}->{job_downstream_id}: "
+                        + f"{obj_last[ip]} {obj_now[ip]}"
+                    )
+                    return True
         except:  # noqa: E722 yes we really want to capture and reraise *everything*
             exception_type, exception_value, tb = sys.exc_info()
             captured_tb = ppg_traceback.Trace(exception_type, exception_value, tb)
@@ -186,7 +186,7 @@ class ConsoleInteractive:
         """print the currently running jobs (mapped to enter)"""
         t = time.time()
         to_sort = []
-        for job_id in self.runner.jobs_in_flight:
+        for job_id in list(self.runner.jobs_in_flight):
             try:
                 rt = t - self.runner.jobs[job_id].start_time
                 to_sort.append((rt, job_id))
@@ -224,7 +224,7 @@ class ConsoleInteractive:
         if not self.stopped:
             log_info("Run stopped by command")
             waiting_for = []
-            for job_id in self.runner.jobs_in_flight:
+            for job_id in list(self.runner.jobs_in_flight):
                 try:
                     if not getattr(self.runner.jobs[job_id], "waiting", False):
                         waiting_for.append(job_id)
@@ -10,13 +10,16 @@ from .enums import (
 class RecordedJobOutcome:
     """Job run information collector"""
 
+    # one of these per job and run - no need for a __dict__ each
+    __slots__ = ("job_id", "outcome", "payload", "run_time")
+
     def __init__(self, job_id, outcome, payload):
         if not isinstance(outcome, JobOutcome):
             raise ValueError("Not an JobOutcome")
         self.job_id = job_id
         self.outcome = outcome
         self.payload = payload
-        self.runtime = -1
+        self.run_time = -1
 
     @property
     def error(self):
@@ -1,6 +1,7 @@
 from __future__ import annotations
 import json
 import signal
+import select
 import time
 import pickle
 import os
@@ -11,13 +12,15 @@ import inspect
 import types
 from typing import Union, List, Dict, Optional, Tuple, Callable
 from pathlib import Path
-from io import StringIO
+import collections
+import difflib
+import itertools
 from collections import namedtuple
 from threading import Lock
 from deepdiff.deephash import DeepHash, UNPROCESSED_KEY
-from functools import total_ordering
+from functools import total_ordering, lru_cache
 
-from . import hashers, exceptions, ppg_traceback
+from . import hashers, exceptions, ppg_traceback, util
 from .enums import Resources
 from .util import escape_logging
 import hashlib
@@ -34,6 +37,10 @@ from .util import (
 )
 
 module_type = type(sys)
+# global_pipegraph gets replaced by ppg.new(), so we can't import it once.
+# But a 'from . import global_pipegraph' in every (hot) call runs through
+# the import machinery, the attribute lookup on the package is much cheaper.
+_package = sys.modules[__package__]
 is_hex_re = re.compile("^[a-fA-F0-9]+$")
 
 non_chdired_path = Path(".").absolute()
@@ -46,8 +53,124 @@ CachedJobTuple = namedtuple("CachedJobTuple", ["load", "calc"])
 PlotJobTuple = namedtuple("PlotJobTuple", ["plot", "cache", "table"])
 
 
+def _open_anonymous_file(fallback_path):
+    """A "w+b" file that lives in memory only (memfd) where available,
+    so the per-job transport files don't cost an inode create/unlink.
+    Falls back to opening fallback_path.
+
+    Not a pipe: the parent reads only after the child has exited,
+    and a pipe would block a child writing more than the pipe buffer.
+    """
+    if hasattr(os, "memfd_create"):
+        try:
+            return os.fdopen(os.memfd_create(fallback_path.name), "w+b")
+        except OSError:  # pragma: no cover - e.g. seccomp'ed containers
+            pass
+    return open(fallback_path, "w+b")
+
+
+def _wait_for_child(pid):
+    """os.waitpid(pid, WNOHANG) until the child has ended.
+
+    With a pidfd, we wake up as soon as the child exits,
+    instead of sleeping in ever longer intervals (which added 10ms+
+    to even the most trivial job). Either way we return to the interpreter
+    at least once a second, so KeyboardInterrupts are delivered.
+    """
+    try:
+        pidfd = os.pidfd_open(pid)
+    except (AttributeError, OSError):  # pragma: no cover - old kernels / pythons
+        pidfd = None
+    if pidfd is None:  # pragma: no cover
+        sleep_time = 0.01  # which is the minimum time a job can take...
+        time.sleep(sleep_time)
+        wp1, waitstatus = os.waitpid(pid, os.WNOHANG)
+        while wp1 == 0 and waitstatus == 0:
+            sleep_time *= 2
+            if sleep_time > 1:
+                sleep_time = 1
+            time.sleep(sleep_time)
+            wp1, waitstatus = os.waitpid(pid, os.WNOHANG)
+        return wp1, waitstatus
+    try:
+        while True:
+            select.select([pidfd], [], [], 1)
+            wp1, waitstatus = os.waitpid(pid, os.WNOHANG)
+            if wp1 != 0 or waitstatus != 0:
+                return wp1, waitstatus
+    finally:
+        os.close(pidfd)
+
+
+def _missing_files(paths):
+    """The set of paths that don't exist.
+
+    Where many of the paths share a directory, one scandir of it
+    is much cheaper than a stat() per path. Small groups are stat'ed,
+    listing a (possibly huge) directory for a handful of files doesn't pay.
+    """
+    by_dir = collections.defaultdict(list)
+    for p in paths:
+        by_dir[p.parent].append(p)
+    missing = set()
+    for parent, group in by_dir.items():
+        if len(group) < 32:
+            missing.update(p for p in group if not p.exists())
+            continue
+        try:
+            with os.scandir(parent) as entries:
+                present = {
+                    e.name
+                    for e in entries
+                    # exists() follows symlinks - so must we
+                    if not e.is_symlink() or os.path.exists(e.path)
+                }
+        except (FileNotFoundError, NotADirectoryError):
+            present = set()
+        missing.update(p for p in group if p.name not in present)
+    return missing
+
+
+def _stat_unchanged(stat, recorded):
+    """Does stat still match what hashers.hash_file recorded?
+
+    Histories from before mtime_ns/inode were recorded
+    are compared on mtime-in-seconds and size.
+    """
+    if "mtime_ns" in recorded:
+        return (
+            stat.st_mtime_ns == recorded["mtime_ns"]
+            and stat.st_size == recorded.get("size", -1)
+            and stat.st_ino == recorded.get("ino", -1)
+        )
+    return int(stat.st_mtime) == recorded.get(
+        "mtime", -1
+    ) and stat.st_size == recorded.get("size", -1)
+
+
+def _resolve(path):
+    """path.resolve(), but resolving the parent directories only once per graph
+    - resolve() stats every path component, and jobs tend to share their
+    output directories.
+    """
+    global_pipegraph = _package.global_pipegraph
+
+    name = path.name
+    if global_pipegraph is None or name in ("", ".", ".."):
+        return path.resolve()
+    parent = path.parent
+    resolved_parent = global_pipegraph._resolved_dir_cache.get(parent, None)
+    if resolved_parent is None:
+        resolved_parent = parent.resolve()
+        global_pipegraph._resolved_dir_cache[parent] = resolved_parent
+    res = resolved_parent / name
+    if res.is_symlink():  # the last component still needs resolving
+        return path.resolve()
+    return res
+
+
 def _normalize_path(path):
-    from . import global_pipegraph
+    global_pipegraph = _package.global_pipegraph
 
     # this little bit of memoization here saves quite a bit of runtime.
     if global_pipegraph is not None:
@@ -56,20 +179,32 @@ def _normalize_path(path):
             return res
     org_path = path
     path = Path(path)
+    resolved = _resolve(path)
     if path.is_absolute():
-        res = path.resolve()
+        res = resolved
     else:
         try:
-            res = path.resolve().relative_to(global_pipegraph.dir_absolute)
+            res = resolved.relative_to(global_pipegraph.dir_absolute)
         except (AttributeError, ValueError):
-            res = path.resolve().relative_to(Path(".").absolute())
+            res = resolved.relative_to(Path(".").absolute())
     if global_pipegraph is not None:
         global_pipegraph._path_cache[org_path] = res
     return res
 
 
+def _ensure_sorted(seq):
+    """sorted(seq), but single entry lists (ie. most jobs) are returned as is.
+
+    Note that timsort detects already sorted input in a single C level pass,
+    a python level 'is it sorted' check would be slower than just sorting.
+    """
+    if len(seq) < 2:
+        return seq
+    return sorted(seq)
+
+
 def _dedup_job(cls, job_id):
-    from . import global_pipegraph
+    global_pipegraph = _package.global_pipegraph
 
     if global_pipegraph is None:
         raise ValueError("Must instantiate a pipegraph before creating any Jobs")
@@ -79,8 +214,10 @@ def _dedup_job(cls, job_id):
         )
     if "/../" in job_id:
         raise TypeError(f".. in job id not allowed. Was {job_id}")
-    if global_pipegraph.run_mode.is_strict() and job_id in global_pipegraph.jobs:
-        j = global_pipegraph.jobs[job_id]
+    job_id = sys.intern(job_id)
+    # most jobs are new - one dict lookup, and we're done
+    j = global_pipegraph.jobs.get(job_id, None)
+    if j is not None and global_pipegraph.run_mode.is_strict():
         if type(j) is not cls:
             if (
                 str(cls) == "<class 'pypipegraph2.ppg1_compatibility.FileInvariant'>"
@@ -93,9 +230,12 @@ def _dedup_job(cls, job_id):
                 raise exceptions.JobRedefinitionError(
                     f"Redefining job {job_id} with different type - prohibited by RunMode. Was {type(j)}, wants to be {cls}. If the job ids make no sense, check for symlinks"
                 )
-        return global_pipegraph.jobs[job_id]
+        return j
     else:
-        return object.__new__(cls)
+        obj = object.__new__(cls)
+        # Job.__init__ picks this up instead of recalculating it
+        obj.job_id = job_id
+        return obj
 
 
 def _mark_function_wrapped(outer, inner, desc="callback"):
@@ -139,7 +279,7 @@ class Job:
     historical: Optional[Tuple[str, Dict[str, str]]]
 
     def __new__(cls, outputs, *args, **kwargs):
-        return _dedup_job(cls, ":::".join(sorted([str(x) for x in outputs])))
+        return _dedup_job(cls, ":::".join(_ensure_sorted([str(x) for x in outputs])))
 
     def __init__(
         self,
@@ -148,14 +288,13 @@ class Job:
     ):
         self.use_resources(resources)
         if isinstance(outputs, list):
-            self.outputs = self._validate_outputs(outputs)
+            self.outputs = _ensure_sorted(self._validate_outputs(outputs))
         else:  # pragma: no cover
             raise TypeError("Invalid output definition.")
-        self.outputs = sorted([str(x) for x in outputs])
         if not hasattr(
             self, "job_id"
-        ):  # first definition. Otherwise we are a deduped job that has been initialized
-            self.job_id = ":::".join(self.outputs)  # todo: reconsider this
+        ):  # usually set by _dedup_job already
+            self.job_id = sys.intern(":::".join(self.outputs))  # todo: reconsider this
         assert (
             not "!!!" in self.job_id
         )  # we use that to mark edges in the history hashmap/dict
@@ -220,7 +359,7 @@ class Job:
         (possibly the *new* global pipegraph).
         Without any dependencies!
         """
-        from . import global_pipegraph
+        global_pipegraph = _package.global_pipegraph
 
         log_trace(f"adding {self.__class__.__name__} {self.job_id}")
 
@@ -236,18 +375,31 @@ class Job:
             # e.g. FileGeneratingJob ppg1 compatibility with 'no-output-filename parameter'.
             func = func.wrapped_function
             # log_debug(f"Falling back to wrapped function {self.job_id}")
-        try:
-            # we try to share FunctionInvariants if no closure is involved
-            # that saves us many Jobs in some cases
-            if hasattr(func, "__closure__") and func.__closure__ is None:
-                func_invariant = FunctionInvariant(func)  # , self.job_id)
-                func_invariant.usage_counter = (
-                    getattr(func_invariant, "usage_counter", 0) + 1
-                )
-            else:
+        previous = getattr(self, "func_invariant", None)
+        if (
+            isinstance(previous, _FunctionInvariant)
+            and previous.function is func
+            and previous.job_id not in _package.global_pipegraph.jobs
+        ):
+            # readd() into a new graph - keep the invariant,
+            # and with it what it has already calculated for this function
+            previous.readd()
+            if hasattr(previous, "usage_counter"):
+                previous.usage_counter = 1
+            func_invariant = previous
+        else:
+            try:
+                # we try to share FunctionInvariants if no closure is involved
+                # that saves us many Jobs in some cases
+                if hasattr(func, "__closure__") and func.__closure__ is None:
+                    func_invariant = FunctionInvariant(func)  # , self.job_id)
+                    func_invariant.usage_counter = (
+                        getattr(func_invariant, "usage_counter", 0) + 1
+                    )
+                else:
+                    func_invariant = FunctionInvariant(func, self.job_id)
+            except TypeError:
                 func_invariant = FunctionInvariant(func, self.job_id)
-        except TypeError:
-            func_invariant = FunctionInvariant(func, self.job_id)
         self.func_invariant = func_invariant  # we only store it so ppg1.compatibility ignore_code_changes can prune it
         self.depends_on(func_invariant)
 
@@ -277,7 +429,7 @@ class Job:
         not on all files of the (MultiFileGenerating) Job.
         """
 
-        from . import global_pipegraph
+        global_pipegraph = _package.global_pipegraph
 
         if other_job is False and not other_jobs:
             # raise ValueError("You have to pass in at least one job")
@@ -314,13 +466,15 @@ class Job:
                 o_inputs = [other_job]  # that's actually the filenames!
             if o_job.job_id == self.job_id:
                 raise exceptions.NotADag("Job can not depend on itself")
+            # both are O(1) lookups - longer cycles are caught once, when running
             if global_pipegraph.has_edge(self, o_job):
                 raise exceptions.NotADag(
                     f"{o_job.job_id} is already (directly) upstream of {self.job_id}, can't be downstream as well (cycle)"
                 )
-
-            log_trace(f"adding edge {o_job.job_id}, {self.job_id}")
-            global_pipegraph.add_edge(o_job, self)
+            if not global_pipegraph.has_edge(o_job, self):
+                log_trace(f"adding edge {o_job.job_id}, {self.job_id}")
+                global_pipegraph.add_edge(o_job, self)
+            # repeated depends_on may still name additional outputs of o_job
             global_pipegraph.job_inputs[self.job_id].update(o_inputs)
         return self
 
@@ -378,7 +532,7 @@ class Job:
         A job may return something here for interactive work (plot jobs for example
         will return the plot object
         """
-        from . import global_pipegraph
+        global_pipegraph = _package.global_pipegraph
 
         global_pipegraph.run_for_these(self)
         return self._call_result()
@@ -391,7 +545,7 @@ class Job:
         """Interrogate global pipegraph for this job's exception.
         Mostly for the ppg1 tests...
         """
-        from . import global_pipegraph
+        global_pipegraph = _package.global_pipegraph
 
         e = global_pipegraph.last_run_result[self.job_id].error
         if isinstance(e, exceptions.JobError):
@@ -413,7 +567,7 @@ class Job:
         """Interrogate global pipegraph for this job's exception stacktrace.
         Mostly for the ppg1 tests...
         """
-        from . import global_pipegraph
+        global_pipegraph = _package.global_pipegraph
 
         e = global_pipegraph.last_run_result[self.job_id].error
         if isinstance(e, exceptions.JobError):
@@ -425,7 +579,7 @@ class Job:
     def upstreams(self):
         """Return a list of jobs that are directly upstream of this one by querying the
         global pipegraph"""
-        from . import global_pipegraph
+        global_pipegraph = _package.global_pipegraph
 
         gg = global_pipegraph
         return [gg.jobs[job_id] for job_id in gg.job_dag.predecessors(self.job_id)]
@@ -580,8 +734,11 @@ class MultiFileGeneratingJob(Job):
     eval_job_kind = "Output"
 
     def __new__(cls, files, *args, **kwargs):
-        valid_files = cls._validate_files_argument(files)[0]
-        return Job.__new__(cls, [str(x) for x in valid_files])
+        validated = cls._validate_files_argument(files)
+        obj = Job.__new__(cls, [str(x) for x in validated[0]])
+        # so __init__ does not have to normalize every path a second time
+        obj._validated_files = (files, validated)
+        return obj
 
     def __init__(
         self,
@@ -594,7 +751,11 @@ class MultiFileGeneratingJob(Job):
     ):
         self.generating_function = self._validate_func_argument(generating_function)
         self.depend_on_function = depend_on_function
-        self.files, self._lookup = self._validate_files_argument(files)
+        pending = self.__dict__.pop("_validated_files", None)
+        if pending is not None and pending[0] == files:
+            self.files, self._lookup = pending[1]
+        else:
+            self.files, self._lookup = self._validate_files_argument(files)
         if len(self.files) != len(set(self.files)):
             raise ValueError(
                 "Paths were present multiple times in files argument. Fix your input"
@@ -636,7 +797,7 @@ class MultiFileGeneratingJob(Job):
 
     @staticmethod
     def _validate_files_argument(files, allow_absolute=False):
-        from . import global_pipegraph
+        global_pipegraph = _package.global_pipegraph
 
         # print(files)
 
@@ -672,10 +833,9 @@ class MultiFileGeneratingJob(Job):
         if lookup:
             lookup = {lookup[ii]: abs_files[ii] for ii in range(len(lookup))}
         else:
-            temp = sorted([(f, ii) for (ii, f) in enumerate(abs_files)])
-            temp = {ii: f for (f, ii) in temp}
-            lookup = [temp[ii] for ii in range(len(temp))]
-        return sorted(abs_files), lookup
+            # the files in the order they were passed in
+            lookup = abs_files
+        return _ensure_sorted(abs_files), lookup
 
     def readd(self):
         super().readd()
@@ -701,8 +861,9 @@ class MultiFileGeneratingJob(Job):
 
         all_present = True
         del_counter = 0
+        missing = _missing_files(self.files)
         for fn in self.files:
-            if fn.exists():
+            if fn not in missing:
                 # todo figure out what to do with tihs...
                 # # if we were invalidated, we run-  mabye
                 # log_job_trace(
@@ -760,19 +921,24 @@ class MultiFileGeneratingJob(Job):
             # these only get closed by the parent process
             # and we can't use tempfiles.
             # they would get closed by other forked jobs running in parallel
+            # explicit utf-8: no locale dependent codec, and output
+            # that is not valid utf-8 does not break reading it back
             stdout = open(
                 runner.job_graph.dir_config.run_dir
                 / f"{runner.start_time:.2f}_{self.job_number}.stdout",
                 "w+",
+                encoding="utf-8",
+                errors="replace",
             )
             stderr = open(
                 runner.job_graph.dir_config.run_dir
                 / f"{runner.start_time:.2f}_{self.job_number}.stderr",
                 "w+",
+                encoding="utf-8",
+                errors="replace",
             )
-            exception_out = open(
-                runner.job_graph.dir_config.run_dir / f"{self.job_number}.exception",
-                "w+b",
+            exception_out = _open_anonymous_file(
+                runner.job_graph.dir_config.run_dir / f"{self.job_number}.exception"
             )  # note the binary!
 
             def aborted(sig, stack):
@@ -826,9 +992,11 @@ class MultiFileGeneratingJob(Job):
                             captured_tb = ppg_traceback.Trace(
                                 exception_type, exception_value, tb
                             )
-                            pickle.dump(captured_tb, exception_out)
+                            pickle.dump(
+                                captured_tb, exception_out, pickle.HIGHEST_PROTOCOL
+                            )
                             traceback_dumped = True
-                            pickle.dump(e, exception_out)
+                            pickle.dump(e, exception_out, pickle.HIGHEST_PROTOCOL)
                             exception_out.flush()
                         except Exception as e2:
                             # msg = f"FileGeneratingJob raised exception, but saving the exception failed: \n{type(e)} {escape_logging(e)} - \n {type(e2)} {escape_logging(e2)}\n"
@@ -851,16 +1019,8 @@ class MultiFileGeneratingJob(Job):
                         # os.dup2(stderr_, 2)
                         os._exit(error_exit_code)
                 else:
-                    sleep_time = 0.01  # which is the minimum time a job can take...
-                    time.sleep(sleep_time)
-                    wp1, waitstatus = os.waitpid(self.pid, os.WNOHANG)
                     try:
-                        while wp1 == 0 and waitstatus == 0:
-                            sleep_time *= 2
-                            if sleep_time > 1:
-                                sleep_time = 1
-                            time.sleep(sleep_time)
-                            wp1, waitstatus = os.waitpid(self.pid, os.WNOHANG)
+                        wp1, waitstatus = _wait_for_child(self.pid)
                     except (
                         KeyboardInterrupt
                     ):  # pragma: no cover  todo: interactive testing
@@ -887,9 +1047,6 @@ class MultiFileGeneratingJob(Job):
                                 stdout, stderr
                             )
                             exception_out.seek(0, 0)
-                            raw = exception_out.read()
-                            # log_info(f"Raw exception result {raw}")
-                            exception_out.seek(0, 0)
 
                             tb = None
                             exception = None
@@ -935,31 +1092,47 @@ class MultiFileGeneratingJob(Job):
                 stderr.close()
                 os.unlink(stderr.name)
                 exception_out.close()
-                # log_error(f"unlinking {exception_out.name}")
-                try:
-                    os.unlink(exception_out.name)
-                except FileNotFoundError:
-                    log_error(f"file not found for unlinking? {exception_out.name}")
+                if isinstance(exception_out.name, str):  # not a memfd
+                    # log_error(f"unlinking {exception_out.name}")
+                    try:
+                        os.unlink(exception_out.name)
+                    except FileNotFoundError:
+                        log_error(
+                            f"file not found for unlinking? {exception_out.name}"
+                        )
 
                 self.pid = None
         else:
             self.generating_function(*input)
-        missing_files = [x for x in self.files if not x.exists()]
+        if self.empty_ok:
+            missing = _missing_files(self.files)
+            empty_files = None
+        else:  # one stat per file answers both questions
+            missing = set()
+            empty_files = []
+            for x in self.files:
+                try:
+                    if x.stat().st_size == 0:
+                        empty_files.append(x)
+                except FileNotFoundError:
+                    missing.add(x)
+        missing_files = [x for x in self.files if x in missing]
         if missing_files:
             for m in sorted(missing_files):
                 log_error(f"Job '{self.job_id}' - file not created: '{m}'")
             raise exceptions.JobContractError(
                 f"Job {self.job_id} did not create the following files: {[str(x) for x in missing_files]}"
             )
-        if not self.empty_ok:
-            empty_files = [x for x in self.files if x.stat().st_size == 0]
-            if empty_files:
-                raise exceptions.JobContractError(
-                    f"Job {self.job_id} created empty files and empty_ok was False: {[str(x) for x in empty_files]}"
-                )
-        res = {
-            str(of): hashers.hash_file(self._map_filename(of)) for of in self.org_files
-        }
+        if empty_files:
+            raise exceptions.JobContractError(
+                f"Job {self.job_id} created empty files and empty_ok was False: {[str(x) for x in empty_files]}"
+            )
+        res = dict(
+            zip(
+                (str(of) for of in self.org_files),
+                hashers.hash_files([self._map_filename(of) for of in self.org_files]),
+            )
+        )
         return res
 
     def _read_stdout_stderr(self, stdout, stderr):
@@ -1012,9 +1185,10 @@ class MultiFileGeneratingJob(Job):
             # other wise we have no history, and the skipping would
             # break the graph execution
             if str(fn) not in runner.job_states[self.job_id].historical_output:
-                log_job_trace(
-                    f"No history for {fn}, {escape_logging(runner.job_states[self.job_id].historical_output)}"
-                )
+                if util.do_jobtrace_log:
+                    log_job_trace(
+                        f"No history for {fn}, {escape_logging(runner.job_states[self.job_id].historical_output)}"
+                    )
                 return True
         return False
 
@@ -1093,9 +1267,7 @@ class MultiTempFileGeneratingJob(MultiFileGeneratingJob):
                 filename = str(filename)
                 if filename in historical_output:
                     stat = Path(self._map_filename(filename)).stat()
-                    if int(stat.st_mtime) == historical_output[filename].get(
-                        "mtime", -1
-                    ) and stat.st_size == historical_output[filename].get("size", -1):
+                    if _stat_unchanged(stat, historical_output[filename]):
                         new_hashes[filename] = historical_output[filename]
                         continue
                 new_hashes[filename] = hashers.hash_file(self._map_filename(filename))
@@ -1117,10 +1289,7 @@ class MultiTempFileGeneratingJob(MultiFileGeneratingJob):
         return MultiFileGeneratingJob.run(self, runner, historical_output)
 
     def all_files_exist(self):
-        for fn in self.org_files:
-            if not fn.exists():
-                return False
-        return True
+        return not _missing_files(self.org_files)
 
     def output_needed(self, runner):
         raise NotImplementedError("unreachable")  # pragma: no cover
@@ -1237,14 +1406,19 @@ class _FunctionInvariant(_InvariantMixin, Job, _FileInvariantMixin):
             "<"
         ):  # we only have a source file for python functions.
             # sf = Path(sf)
-            stat = sf.stat()
+            if runner is not None:
+                # many functions share one source file - stat it once per run
+                if not hasattr(runner, "_source_stat_cache"):
+                    runner._source_stat_cache = {}
+                stat = runner._source_stat_cache.get(sf, None)
+                if stat is None:
+                    stat = sf.stat()
+                    runner._source_stat_cache[sf] = stat
+            else:
+                stat = sf.stat()
             if historical_output:
                 if "source_file" in historical_output:
-                    if int(stat.st_mtime) == historical_output["source_file"].get(
-                        "mtime", -1
-                    ) and stat.st_size == historical_output["source_file"].get(
-                        "size", -1
-                    ):
+                    if _stat_unchanged(stat, historical_output["source_file"]):
                         # the file did not change at all
                         file_unchanged = True
                         new_file_hash = historical_output["source_file"]
@@ -1264,32 +1438,81 @@ class _FunctionInvariant(_InvariantMixin, Job, _FileInvariantMixin):
         else:
             line_no = self.function.__code__.co_firstlineno
         line_unchanged = line_no == historical_output.get("source_line_no", False)
-        log_trace(
-            f"{self.job_id}, {file_unchanged}, {line_unchanged}, {escape_logging(new_file_hash)}, {escape_logging(historical_output)}"
-        )
+        if util.do_jobtrace_log:
+            log_trace(
+                f"{self.job_id}, {file_unchanged}, {line_unchanged}, {escape_logging(new_file_hash)}, {escape_logging(historical_output)}"
+            )
 
-        if file_unchanged and line_unchanged and python_version in historical_output:
+        if (
+            file_unchanged
+            and line_unchanged
+            and python_version in historical_output
+            # histories from before the bytecode fingerprints
+            # have the dis text - that needs to be recalculated
+            and isinstance(historical_output[python_version][0], str)
+        ):
+            # the history is our persistent cache - no need to
+            # get the source / fingerprint the bytecode again
             dis = historical_output[python_version][0]
             source = historical_output["source"]
             is_python_func = self.is_python_function(self.function)
         else:
-            source, is_python_func = self.get_source()
-            if is_python_func:
-                dis = (
-                    self.get_dis(self.function),
-                )  # returns (('',),) for cython functions? better to handel it ourselves
+            # FunctionInvariants with different names may wrap the same function,
+            # and closures from one factory share their code object,
+            # so the expensive source / dis extraction is memoized for this run.
+            if runner is None:
+                cache = {}
             else:
-                if self.function is None:
-                    dis = "None"
+                if not hasattr(runner, "_function_invariant_cache"):
+                    runner._function_invariant_cache = {}
+                cache = runner._function_invariant_cache
+            if type(self.function) is types.FunctionType:
+                code = self.function.__code__
+                # code equality ignores the file name
+                cache_key = (
+                    code,
+                    code.co_filename,
+                    self.function.__name__,
+                    self.function.__doc__,
+                )
+            else:
+                # The function is kept alive by this job, so its id can't be reused.
+                cache_key = (
+                    id(self.function),
+                    getattr(getattr(self.function, "__code__", None), "co_code", None),
+                )
+            memo = getattr(self, "_memo", None)  # from a previous graph
+            if memo is not None and memo[0] == cache_key:
+                source, is_python_func, dis = memo[1]
+            elif cache_key in cache:
+                source, is_python_func, dis = cache[cache_key]
+            else:
+                source, is_python_func = self.get_source()
+                if is_python_func:
+                    dis = self.get_dis(self.function)
                 else:
-                    dis = ""
+                    if self.function is None:
+                        dis = "None"
+                    else:
+                        dis = ""
+                cache[cache_key] = (source, is_python_func, dis)
+            self._memo = (cache_key, (source, is_python_func, dis))
 
         if is_python_func:
+            if runner is None:
+                cell_cache = None
+            else:
+                if not hasattr(runner, "_closure_repr_cache"):
+                    runner._closure_repr_cache = {}
+                cell_cache = runner._closure_repr_cache
             closure = self.extract_closure(
-                self.function
+                self.function, cell_cache
             )  # returns an empty string for cython functions
         else:
             closure = ""
+        # the closure repr can get large (think captured dicts) -
+        # we only ever compare it, so store (and compare) a digest
+        closure = self._closure_digest(closure)
 
         res = {"source": source, "source_line_no": line_no}
         res[python_version] = (dis, closure)
@@ -1300,6 +1523,18 @@ class _FunctionInvariant(_InvariantMixin, Job, _FileInvariantMixin):
 
     def compare_hashes(self, old_hash, new_hash, python_version=python_version):
         if python_version in new_hash and python_version in old_hash:
+            if isinstance(new_hash[python_version][0], str) != isinstance(
+                old_hash[python_version][0], str
+            ):
+                # history predates the bytecode fingerprints (it has the dis text,
+                # and the raw closure). Don't invalidate everything just because of that
+                old_closure = _FunctionInvariant._closure_digest(
+                    old_hash[python_version][1]
+                )
+                return (
+                    new_hash["source"] == old_hash["source"]
+                    and new_hash[python_version][1] == old_closure
+                )
             res = new_hash[python_version] == old_hash[python_version]
             # log_trace(f"Comparing based on bytecode: result {res}")
             return res
@@ -1310,21 +1545,38 @@ class _FunctionInvariant(_InvariantMixin, Job, _FileInvariantMixin):
             # log_trace(f"Comparing based on source: result {res}")
             return res
 
+    @staticmethod
+    def _closure_digest(closure):
+        return hashers.hash_str(closure) if closure else ""
+
     def extract_strict_hash(self, a_hash) -> bytes:
         return a_hash["source"].encode("utf-8")
 
     def get_source_file_name(self):
         if self.is_python_function(self.function):
+            # getsourcefile checks the file system and the module loaders,
+            # and all functions from one file share the answer
+            global_pipegraph = _package.global_pipegraph
+            key = self.function.__code__.co_filename
+            if global_pipegraph is not None:
+                res = global_pipegraph._source_file_cache.get(key, None)
+                if res is not None:
+                    return res
             sf = inspect.getsourcefile(self.function)
             if sf == sys.argv[0]:  # at least python 3.8 does not have this absolute.
                 # might change with 3.9? https://bugs.python.org/issue20443
-                return non_chdired_path / sf  # pragma: no cover
+                res = non_chdired_path / sf  # pragma: no cover
             else:
-                return Path(sf)
+                res = Path(sf)
+            if global_pipegraph is not None:
+                global_pipegraph._source_file_cache[key] = res
+            return res
         return None
 
     @staticmethod
     def is_python_function(function):
+        if type(function) is types.FunctionType:  # the common case
+            return True
         if (not hasattr(function, "__code__")) or (
             "cython_function_or_method" in str(type(function))
             or (
@@ -1348,7 +1600,7 @@ class _FunctionInvariant(_InvariantMixin, Job, _FileInvariantMixin):
 
     @staticmethod
     def _get_python_source(function):
-        from . import global_pipegraph
+        global_pipegraph = _package.global_pipegraph
 
         key = (function.__code__.co_filename, function.__code__.co_firstlineno)
         if key in global_pipegraph.func_cache:
@@ -1360,20 +1612,61 @@ class _FunctionInvariant(_InvariantMixin, Job, _FileInvariantMixin):
             if source.startswith("def"):
                 source = source[source.find("(") :]
             # filter doc string
-            if function.__doc__:
+            # (replace is a single scan, and a no-op if it's not there)
+            if function.__doc__ and function.__doc__ in source:
                 for prefix in ['"""', "'''", '"', "'"]:
-                    if prefix + function.__doc__ + prefix in source:
-                        source = source.replace(
-                            prefix + function.__doc__ + prefix,
-                            "",
-                        )
+                    source = source.replace(
+                        prefix + function.__doc__ + prefix,
+                        "",
+                    )
 
             global_pipegraph.func_cache[key] = source
         return source
 
     @classmethod
     def get_dis(cls, function):
-        return (cls.dis_code(function.__code__, function),)
+        """Fingerprint the function's bytecode.
+
+        Much cheaper than formating dis.dis output, and we only ever
+        compare it for equality anyway.
+        """
+        return hashers.hash_bytes(
+            cls._bytecode_fingerprint(
+                function.__code__, function.__name__, function.__doc__
+            )
+        )
+
+    @classmethod
+    def _bytecode_fingerprint(cls, code, name=None, docstring=None):
+        """bytes describing a code object, without line numbers and addresses.
+        Nested code objects (lambdas, inner functions, comprehensions)
+        are descended into.
+        """
+        consts = []
+        for ii, constant in enumerate(code.co_consts):
+            if isinstance(constant, types.CodeType):
+                consts.append(cls._bytecode_fingerprint(constant))
+            elif ii == 0 and docstring is not None and constant == docstring:
+                # docstrings are irrelevant
+                consts.append(None)
+            else:
+                consts.append(repr(constant))
+        if name is not None:
+            # so are function names (which only show up here on recursion)
+            names = tuple(
+                "<func name ommited>" if x == name else x for x in code.co_names
+            )
+        else:
+            names = code.co_names
+        return code.co_code + repr(
+            (
+                consts,
+                names,
+                code.co_varnames,
+                code.co_freevars,
+                code.co_cellvars,
+            )
+        ).encode("utf-8")
 
     @classmethod
     def _get_source_from_non_python_function(cls, function):
@@ -1403,6 +1696,12 @@ class _FunctionInvariant(_InvariantMixin, Job, _FileInvariantMixin):
             return False
         elif hasattr(a, "__code__") and hasattr(a, "__closure__"):
             if hasattr(b, "__code__") and hasattr(b, "__closure__"):
+                if a is b or (
+                    a.__code__ is b.__code__ and a.__closure__ is b.__closure__
+                ):
+                    # the common case of a job being redefined with the same function
+                    # - no need to compare every field of the code objects
+                    return True
                 return (a.__code__ == b.__code__) and (a.__closure__ == b.__closure__)
             else:
                 return False
@@ -1419,7 +1718,17 @@ class _FunctionInvariant(_InvariantMixin, Job, _FileInvariantMixin):
         elif hasattr(a, "__code__") and hasattr(a, "__closure__"):
             if hasattr(b, "__code__") and hasattr(b, "__closure__"):
                 if not (a.__code__ == b.__code__):
-                    return "The function __code__ differed"
+                    # the invariant only keeps a fingerprint - disassemble
+                    # just for the explanation
+                    diff = difflib.unified_diff(
+                        _FunctionInvariant.dis_code(a.__code__, a).split("\n"),
+                        _FunctionInvariant.dis_code(b.__code__, b).split("\n"),
+                        "A",
+                        "B",
+                        lineterm="",
+                    )
+                    diff = "\n".join(itertools.islice(diff, 50))
+                    return f"The function __code__ differed\n{diff}"
                 elif not (a.__closure__ == b.__closure__):
                     in_a = "in A:\n"
                     in_b = "in B:\n"
@@ -1470,13 +1779,17 @@ class _FunctionInvariant(_InvariantMixin, Job, _FileInvariantMixin):
             )
 
     @staticmethod
-    def extract_closure(function):
-        """extract the bound variables from a function into a string representation"""
+    def extract_closure(function, cell_cache=None):
+        """extract the bound variables from a function into a string representation
+
+        Closures from one factory share their cells - pass a cell_cache dict
+        (for one run, values might change in between) to repr each only once.
+        """
         try:
             closure = function.func_closure
         except AttributeError:
             closure = function.__closure__
-        output = ""
+        output = []
         if closure:
             for name, cell in zip(function.__code__.co_freevars, closure):
                 # we ignore references to self - in that use case you're expected
@@ -1491,61 +1804,94 @@ class _FunctionInvariant(_InvariantMixin, Job, _FileInvariantMixin):
                         and not hasattr(cell.cell_contents, "__code__")
                         and not isinstance(cell.cell_contents, module_type)
                     ):
-                        if isinstance(cell.cell_contents, dict):
-                            x = repr(sorted(list(cell.cell_contents.items())))
-                        elif isinstance(cell.cell_contents, set) or isinstance(
-                            cell.cell_contents, frozenset
+                        contents = cell.cell_contents
+                        if cell_cache is not None:
+                            # keep cell & contents alive, so the ids are not reused
+                            hit = cell_cache.get(id(cell), None)
+                            if hit is not None and hit[1] is contents:
+                                output.append(hit[2])
+                                continue
+                        if (
+                            isinstance(contents, (dict, set, frozenset))
+                            and len(contents) > 64
                         ):
-                            x = repr(sorted(list(cell.cell_contents)))
+                            # don't build one huge string
+                            x = _FunctionInvariant._digest_container(contents)
+                        elif isinstance(contents, dict):
+                            x = repr(sorted(contents.items()))
+                        elif isinstance(contents, set) or isinstance(
+                            contents, frozenset
+                        ):
+                            x = repr(sorted(contents))
                         else:
-                            x = repr(cell.cell_contents)
-                        if (
-                            "at 0x" in x
-                        ):  # if you don't have a sensible str(), we'll default to the class path. This takes things like <chipseq.quality_control.AlignedLaneQualityControl at 0x73246234>.
-                            x = x[: x.find("at 0x")]
-                        if "id=" in x:  # pragma: no cover - defensive
+                            x = repr(contents)
+                        # if you don't have a sensible str(), we'll default to the class path. This takes things like <chipseq.quality_control.AlignedLaneQualityControl at 0x73246234>.
+                        at = x.find("at 0x")
+                        if at != -1:
+                            x = x[:at]
+                        if __debug__ and "id=" in x:  # pragma: no cover - defensive
                             raise ValueError("Still an issue, %s", repr(x))
-                        output += "\n" + x
+                        if cell_cache is not None:
+                            cell_cache[id(cell)] = (cell, contents, x)
+                        output.append(x)
                 except ValueError as e:  # pragma: no cover - defensive
                     if str(e) == "Cell is empty":
                         pass
                     else:
                         raise
-        return output
+        if not output:
+            return ""
+        return "\n" + "\n".join(output)
 
-    inner_code_object_re = re.compile(
-        r"(<code\sobject\s<?[^>]+>?\sat\s0x[a-f0-9]+[^>]+)"
-        + "|"
-        + "(<code\tobject\t<[^>]+>,\tfile\t'[^']+',\tline\t[0-9]+)"  # that's the cpython way  # that's how they look like in pypy. More sensibly, actually
-    )
+    @staticmethod
+    def _digest_container(contents):
+        """Digest of a (sorted) dict or set, fed entry by entry"""
+        hasher = hashers.hasher_factory()
+        if isinstance(contents, dict):
+            entries = (f"{k!r}={v!r};" for (k, v) in sorted(contents.items()))
+        else:
+            entries = (f"{v!r};" for v in sorted(contents))
+        for entry in entries:
+            at = entry.find("at 0x")
+            if at != -1:
+                entry = entry[:at]
+            hasher.update(entry.encode("utf-8"))
+        return f"{type(contents).__name__} of {len(contents)}: {hasher.hexdigest()}"
 
     @classmethod
     def dis_code(cls, code, function, version_info=sys.version_info):
-        """'dissassemble' python code.
-        Strips lambdas (they change address every execution otherwise),
-        but beginning with 3.7 these are actually included
+        """'dissassemble' python code into text.
+        Without line numbers, and nested code objects (lambdas, inner functions,
+        comprehensions) are listed after their parent, without their address
+        (which changes every execution).
+
+        The invariant itself uses get_dis' fingerprint, this is for humans.
+        (version_info is ignored - it used to switch on manual descent for
+        python < 3.7)
         """
-
-        out = StringIO()
-        dis.dis(code, file=out)
-        discode = out.getvalue().split("\n")
-        # now, eat of the line nos, if there are any
-        res = []
-        for row in discode:
-            row = row.split()
-            res.append("\t".join(row[1:]))
-        res = "\n".join(res)
-        res = cls.inner_code_object_re.sub("lambda", res)
+        rows = []
         if function and hasattr(function, "__qualname__"):
-            res = res.replace(function.__qualname__, "<func name ommited>")
-        # beginning with  version 3.7, this piece of code is obsolete,
-        # since dis does depth descend by itself way.
-        if version_info < (3, 7):  # pragma: no cover
-            for ii, constant in enumerate(code.co_consts):
-                if hasattr(constant, "co_code"):
-                    res += "inner no %i" % ii
-                    res += cls.dis_code(constant, None)
-        return res
+            qualname = function.__qualname__
+        else:
+            qualname = None
+        cls._dis_rows(code, rows, qualname)
+        return "\n".join(rows)
+
+    @classmethod
+    def _dis_rows(cls, code, rows, qualname):
+        nested = []
+        for instr in dis.get_instructions(code):
+            if isinstance(instr.argval, types.CodeType):
+                nested.append(instr.argval)
+                rows.append(f"{instr.opname}\tlambda")
+            else:
+                argrepr = instr.argrepr
+                if qualname and qualname in argrepr:
+                    argrepr = argrepr.replace(qualname, "<func name ommited>")
+                rows.append(f"{instr.opname}\t{argrepr}")
+        for inner in nested:
+            rows.append("")
+            cls._dis_rows(inner, rows, qualname)
 
     @staticmethod
     def get_cython_source(cython_func):
@@ -1598,9 +1944,10 @@ class _FunctionInvariant(_InvariantMixin, Job, _FileInvariantMixin):
             body = body[:-1]
         return head + "\n" + "\n".join(body)
 
+    cython_code_re = re.compile(r'.* file "(?P<file_name>.*)", line (?P<line>\d*)>')
+
     def get_cython_filename_and_line_no(cython_func):
-        pattern = re.compile(r'.* file "(?P<file_name>.*)", line (?P<line>\d*)>')
-        match = pattern.match(str(cython_func.func_code))
+        match = _FunctionInvariant.cython_code_re.match(str(cython_func.func_code))
         if match:
             line_no = int(match.group("line"))
             filename = match.group("file_name")
@@ -1619,8 +1966,15 @@ class _FunctionInvariant(_InvariantMixin, Job, _FileInvariantMixin):
             )
             # find the right module
             module_name = cython_func.im_class.__module__
-            found = False
-            for name in sorted(sys.modules):
+            global_pipegraph = _package.global_pipegraph
+            if global_pipegraph is not None:
+                # walking all modules once per class is plenty
+                found = global_pipegraph._cython_module_cache.get(
+                    cython_func.im_class, False
+                )
+            else:
+                found = False
+            for name in sorted(sys.modules) if not found else ():
                 if name == module_name or name.endswith("." + module_name):
                     try:
                         if (
@@ -1644,6 +1998,8 @@ class _FunctionInvariant(_InvariantMixin, Job, _FileInvariantMixin):
                         continue
             if not found:  # pragma: no cover
                 raise ValueError("Could not find module for %s" % cython_func)
+            if global_pipegraph is not None:
+                global_pipegraph._cython_module_cache[cython_func.im_class] = found
             filename = found.__file__.replace(".so", ".pyx").replace(
                 ".pyc", ".py"
             )  # pyc replacement is for mock testing
@@ -1658,7 +2014,7 @@ class _FunctionInvariant(_InvariantMixin, Job, _FileInvariantMixin):
         if hasattr(self, "function") and not _FunctionInvariant.functions_equal(
             function, self.function
         ):
-            from . import global_pipegraph
+            global_pipegraph = _package.global_pipegraph
 
             if global_pipegraph.run_mode.is_strict():
                 raise exceptions.JobRedefinitionError(
@@ -1746,7 +2102,7 @@ class FileInvariant(_InvariantMixin, Job, _FileInvariantMixin):
         return super().__new__(cls, [str(_normalize_path(file))])
 
     def __init__(self, file):
-        from . import global_pipegraph
+        global_pipegraph = _package.global_pipegraph
 
         self.file = Path(file)
         super().__init__([str(_normalize_path(file))])
@@ -1765,28 +2121,21 @@ class FileInvariant(_InvariantMixin, Job, _FileInvariantMixin):
 
     def run(self, _runner, historical_output):
         self.did_hash_last_run = False  # for testing.
-        if not self.file.exists():
-            raise FileNotFoundError(f"{self.file} did not exist")
-        stat = self.file.stat()
+        try:  # one stat() instead of exists() + stat()
+            stat = self.file.stat()
+        except FileNotFoundError:
+            raise FileNotFoundError(f"{self.file} did not exist") from None
         if not historical_output:
             self.did_hash_last_run = "no history"
             return {self.outputs[0]: self.calculate(self.file, stat)}
         else:
-            mtime_the_same = int(stat.st_mtime) == historical_output[
-                self.outputs[0]
-            ].get("mtime", -1)
-            size_the_same = stat.st_size == historical_output[self.outputs[0]].get(
-                "size", -1
-            )
-            if mtime_the_same and size_the_same:
+            if _stat_unchanged(stat, historical_output[self.outputs[0]]):
                 return historical_output
             else:
                 # log_info("File changed -> recalc")
                 # log_info(f"{historical_output}, ")
-                # log_info(f"mtime: {int(stat.st_mtime)}, size: {stat.st_size}")
-                # log_info(f"mtime the same: {mtime_the_same}")
-                # log_info(f"size the same: {size_the_same}")
-                self.did_hash_last_run = (mtime_the_same, size_the_same)
+                # log_info(f"mtime: {stat.st_mtime_ns}, size: {stat.st_size}")
+                self.did_hash_last_run = True
                 return {self.outputs[0]: self.calculate(self.file, stat)}
 
     def compare_hashes(self, old_hash, new_hash):
@@ -1829,6 +2178,9 @@ class ParameterInvariant(_InvariantMixin, Job):
         to get a hash value..
         """
 
+        if type(obj) in _atomic_parameter_types:
+            # the common case - skip setting up a DeepHash
+            return _freeze_atomic(obj)
         if callable(obj):
             raise TypeError(
                 "ParamaterInvariants do not store Functions. Use FunctionInvariant for that"
@@ -1836,18 +2188,31 @@ class ParameterInvariant(_InvariantMixin, Job):
         # if isinstance(obj, str) and len(obj) == 32 and is_hex_re.match(obj):
         # If it's already a hash, we keep it that way
         #   return obj
-        res = DeepHash(obj, hasher=hashers.hash_str)
-        if UNPROCESSED_KEY in res:  # pragma: no cover
-            errs = []
-            for k in res[UNPROCESSED_KEY]:
-                errs.append(k)
-            raise ValueError("Hashing failed on parent obj", obj, "reasons", errs)
-        return res[obj]
+        return _deep_hash(obj)
 
     def extract_strict_hash(self, a_hash) -> bytes:
         return str(ParameterInvariant.freeze(a_hash)).encode("utf-8")
 
 
+# floats are left out: 0.0 == -0.0, but they hash differently
+_atomic_parameter_types = {str, bytes, int, bool, type(None)}
+
+
+@lru_cache(maxsize=4096, typed=True)  # typed: 1 and True hash differently
+def _freeze_atomic(obj):
+    return _deep_hash(obj)
+
+
+def _deep_hash(obj):
+    res = DeepHash(obj, hasher=hashers.hash_str)
+    if UNPROCESSED_KEY in res:  # pragma: no cover
+        errs = []
+        for k in res[UNPROCESSED_KEY]:
+            errs.append(k)
+        raise ValueError("Hashing failed on parent obj", obj, "reasons", errs)
+    return res[obj]
+
+
 class ValuePlusHash:
     """Wrapper to signal AttributeLoading/DataLoadingJob that you have already calculated a hash on this"""
 
@@ -1922,10 +2287,11 @@ class DataLoadingJob(Job):
     def run(self, runner, historical_output):
         load_res = self.load_function()
 
-        log_trace(
-            f"dl {self.job_id} - historical: {historical_output.get(self.outputs[0], False)}"
-        )
-        log_trace(f"dl {self.job_id} - {escape_logging(historical_output)}")
+        if util.do_jobtrace_log:
+            log_trace(
+                f"dl {self.job_id} - historical: {historical_output.get(self.outputs[0], False)}"
+            )
+            log_trace(f"dl {self.job_id} - {escape_logging(historical_output)}")
         if load_res is None:
             log_warning(
                 f"DataLoadingJob {self.job_id} returned None - downstreams will never be invalidated by this"
@@ -1945,6 +2311,11 @@ class DataLoadingJob(Job):
         return a_hash.encode("utf-8")
 
 
+# pickle writes many small frames - the default 8kb buffer means a syscall each.
+# (the loads read_bytes() the whole file anyway, they need the bytes for hashing)
+_cache_io_buffer_size = 4 * 1024 * 1024
+
+
 def CachedDataLoadingJob(
     cache_filename,
     calc_function,
@@ -1956,16 +2327,15 @@ def CachedDataLoadingJob(
     # early func definition & checking so we don't create a calc job if the load job will fail
 
     def do_cache(output_filename):  # pragma: no cover - spawned job
-        with open(output_filename, "wb") as op:
+        with open(output_filename, "wb", buffering=_cache_io_buffer_size) as op:
             pickle.dump(calc_function(), op, pickle.HIGHEST_PROTOCOL)
 
     def load():
         try:
-            with open(cache_filename, "rb") as op:
-                raw = op.read()
-                res = pickle.loads(raw)
-                load_function(res)
-                return raw
+            raw = cache_filename.read_bytes()
+            res = pickle.loads(raw)
+            load_function(res)
+            return raw
         except pickle.UnpicklingError as e:
             raise pickle.UnpicklingError(
                 f"Unpickling error in file {cache_filename}", e
@@ -2008,7 +2378,7 @@ class AttributeLoadingJob(
         depend_on_function=True,
         resources: Resources = Resources.SingleCore,
     ):
-        from . import global_pipegraph
+        global_pipegraph = _package.global_pipegraph
 
         if global_pipegraph.run_mode.is_strict():
             if hasattr(self, "object"):  # inited before
@@ -2078,16 +2448,15 @@ def CachedAttributeLoadingJob(
     cache_filename = Path(cache_filename)
 
     def do_cache(output_filename):  # pragma: no cover
-        with open(output_filename, "wb") as op:
+        with open(output_filename, "wb", buffering=_cache_io_buffer_size) as op:
             pickle.dump(data_function(), op, pickle.HIGHEST_PROTOCOL)
 
     def load(object=object, attribute_name=attribute_name):
         try:
-            with open(cache_filename, "rb") as op:
-                raw = op.read()
-                return ValuePlusHash(
-                    pickle.loads(raw), hashers.hash_bytes(raw)
-                )  # for hashing
+            raw = cache_filename.read_bytes()
+            return ValuePlusHash(
+                pickle.loads(raw), hashers.hash_bytes(raw)
+            )  # for hashing
         except pickle.UnpicklingError as e:
             raise pickle.UnpicklingError(
                 f"Unpickling error in file {cache_filename}", e
@@ -2217,7 +2586,7 @@ def PlotJob(  # noqa:C901
     If create_table is set, the third one is a FileGeneratingJob
     writing (output_filename + '.tsv').
     """
-    from . import global_pipegraph
+    global_pipegraph = _package.global_pipegraph
 
     if render_args is None:
         render_args = {}
@@ -2390,11 +2759,13 @@ class SharedMultiFileGeneratingJob(MultiFileGeneratingJob):
 
     def __new__(cls, output_dir_prefix, files, *_args, **_kwargs):
         output_dir_prefix = Path(output_dir_prefix)
-        files = cls._validate_files_argument(files, allow_absolute=True)[0]
-        files = [output_dir_prefix / "__never_placed_here__" / f for f in files] + [
-            output_dir_prefix
-        ]
-        return Job.__new__(cls, [str(x) for x in files])
+        validated = cls._validate_files_argument(files, allow_absolute=True)
+        job_files = [
+            output_dir_prefix / "__never_placed_here__" / f for f in validated[0]
+        ] + [output_dir_prefix]
+        obj = Job.__new__(cls, [str(x) for x in job_files])
+        obj._validated_files = (files, validated)
+        return obj
 
     def __init__(
         self,
@@ -2422,9 +2793,13 @@ class SharedMultiFileGeneratingJob(MultiFileGeneratingJob):
         self.generating_function = self._validate_func_argument(generating_function)
         self.depend_on_function = depend_on_function
 
-        self.files, self._lookup = self._validate_files_argument(
-            files, allow_absolute=True
-        )
+        pending = self.__dict__.pop("_validated_files", None)
+        if pending is not None and pending[0] == files:
+            self.files, self._lookup = pending[1]
+        else:
+            self.files, self._lookup = self._validate_files_argument(
+                files, allow_absolute=True
+            )
         self.org_files = [
             (self.output_dir_prefix / "__never_placed_here__" / f) for f in self.files
         ]
@@ -2504,7 +2879,7 @@ class SharedMultiFileGeneratingJob(MultiFileGeneratingJob):
 
     def run(self, runner, historical_output):
         import socket
-        from . import global_pipegraph
+        global_pipegraph = _package.global_pipegraph
 
         by_input_key = self._derive_output_name(runner)
         log_job_trace(f"{self.job_id} run input key {by_input_key}")
@@ -2645,11 +3020,7 @@ class SharedMultiFileGeneratingJob(MultiFileGeneratingJob):
                 if str(of) in historical_output:
                     stat = of_on_disk.stat()
                     hist = historical_output.get(str(of))
-                    if (
-                        hist is not None
-                        and hist["mtime"] == int(stat.st_mtime)
-                        and hist["size"] == stat.st_size
-                    ):
+                    if hist is not None and _stat_unchanged(stat, hist):
                         h = hist
                 if h is None:
                     h = hashers.hash_file(of_on_disk)
@@ -2688,7 +3059,7 @@ class SharedMultiFileGeneratingJob(MultiFileGeneratingJob):
         """Write the input key we used to a log file,
         so that non-ppg-interactive stuff may read it back
         and find the files"""
-        from . import global_pipegraph
+        global_pipegraph = _package.global_pipegraph
 
         fn = (
             global_pipegraph.dir_config.history_dir
@@ -2765,13 +3136,17 @@ class SharedMultiFileGeneratingJob(MultiFileGeneratingJob):
         if not input_names:
             return "no_input"
         updated_input = {}
+        job_outputs = {}  # one fetch & parse per upstream job, not per input
         for input_filename in input_names:
             upstream_job_id = runner.outputs_to_job_ids[input_filename]
             try:
-                job_output = runner.evaluator.get_job_output(upstream_job_id)
-                job_output = json.loads(job_output)
-                jj = job_output[input_filename]
-                updated_input[input_filename] = jj
+                if upstream_job_id not in job_outputs:
+                    job_outputs[upstream_job_id] = json.loads(
+                        runner.evaluator.get_job_output(upstream_job_id)
+                    )
+                updated_input[input_filename] = job_outputs[upstream_job_id][
+                    input_filename
+                ]
             except ValueError:  # pragma: no cover
                 raise ValueError(
                     "deriving output name on SharedMultiFileGeneratingJob "
@@ -2797,8 +3172,7 @@ class SharedMultiFileGeneratingJob(MultiFileGeneratingJob):
         """
         hasher = hashlib.sha512()
         for key, value in sorted(hashes.items()):
-            job_id = runner.job_graph.outputs_to_job_ids[key]
-            job = runner.jobs[job_id]
+            job = runner.jobs[runner.outputs_to_job_ids[key]]
             if isinstance(job, SharedMultiFileGeneratingJob) and key == str(
                 job.output_dir_prefix
             ):
@@ -2846,25 +3220,22 @@ class SharedMultiFileGeneratingJob(MultiFileGeneratingJob):
             if isinstance(key, int):
                 return self._map_filename(self.org_files[key])
             else:
+                marker = "__never_placed_here__/"
+                found = None
                 for org_fn in self.org_files:
                     fn = str(org_fn)
-                    fn = fn[
-                        fn.find("__never_placed_here__/")
-                        + len("__never_placed_here__/") :
-                    ]
-                    if fn == key:
-                        return self._map_filename(org_fn)
-                else:
+                    if fn[fn.find(marker) + len(marker) :] == key:
+                        found = org_fn
+                        break
+                if found is None:
                     search = [
-                        fn[
-                            fn.find("__never_placed_here__/")
-                            + len("__never_placed_here__/") :
-                        ]
+                        fn[fn.find(marker) + len(marker) :]
                         for fn in [str(fn) for fn in self.org_files]
                     ]
                     raise KeyError(
                         f"Could not find {key} in {self.job_id}. Available {search}"
                     )
+                return self._map_filename(found)
         return self._map_filename(self._lookup[key])
 
 
@@ -2899,7 +3270,9 @@ class NotebookInvariant(FileInvariant):
                     NotebookInvariant.extract_notebook_content(file)
                 ),
                 "mtime": int(stat.st_mtime),
+                "mtime_ns": stat.st_mtime_ns,
                 "size": stat.st_size,
+                "ino": stat.st_ino,
             }
 
     @staticmethod
@@ -13,12 +13,21 @@ from types import TracebackType
 from typing import Dict, List, Type
 from traceback import walk_tb
 import inspect
+import linecache
+import reprlib
 import sys
 import os
 from dataclasses import dataclass, field
 import textwrap
 
 _load_cwd = os.path.abspath(os.getcwd())
+_extra_lines = 3  # source context shown around the failing line
+_max_local_length = 1000  # the formatter cuts locals down to this anyway
+
+_short_repr = reprlib.Repr()
+_short_repr.maxlist = _short_repr.maxtuple = 100
+_short_repr.maxdict = _short_repr.maxset = _short_repr.maxfrozenset = 100
+_short_repr.maxstring = _short_repr.maxother = _max_local_length
 
 
 @dataclass
@@ -27,7 +36,9 @@ class Frame:
     lineno: int
     name: str
     locals: Dict[str, str]
-    source: str
+    # just the lines we show, not the whole file
+    source_lines: List[str]
+    source_start: int  # index of source_lines[0] in the file
 
 
 @dataclass
@@ -38,6 +49,36 @@ class Stack:
     frames: List[Frame] = field(default_factory=list)
 
 
+def _str_local(value):
+    """str(value) - but don't build huge strings for huge strings or containers.
+    (Other objects are on their own - e.g. DataFrames and arrays already
+    shorten their str())
+    """
+    t = type(value)
+    if t is str:
+        # one more, so the formatter still adds its '…'
+        return value[: _max_local_length + 1]
+    elif t in (list, tuple, dict, set, frozenset, bytes):
+        # str() of these is their repr()
+        return _short_repr.repr(value)
+    return str(value)
+
+
+def _resolve_filename(frame):
+    try:
+        if (
+            inspect.getsourcefile(frame) == sys.argv[0]
+        ):  # current script, not absolute
+            return os.path.join(_load_cwd, sys.argv[0])  # pragma: no cover
+        else:
+            return inspect.getabsfile(frame)
+    except Exception:  # pragma: no cover
+        filename = frame.f_code.co_filename
+        if filename and not filename.startswith("<"):
+            filename = os.path.abspath(filename) if filename else "?"
+        return filename
+
+
 class Trace:
     def __init__(
         self,
@@ -58,6 +99,10 @@ class Trace:
 
         stacks: List[Stack] = []
         is_cause = False
+        checked_files = set()
+        # getsourcefile/getabsfile stat around and consult the module loaders
+        # - the answer only depends on the code's file name
+        resolved_filenames = {}
 
         while True:
             stack = Stack(
@@ -70,30 +115,29 @@ class Trace:
             append = stack.frames.append
 
             for frame_summary, line_no in walk_tb(traceback):
-                try:
-                    if (
-                        inspect.getsourcefile(frame_summary) == sys.argv[0]
-                    ):  # current script, not absolute
-                        filename = os.path.join(
-                            _load_cwd, sys.argv[0]
-                        )  # pragma: no cover
-                    else:
-                        filename = inspect.getabsfile(frame_summary)
-                except Exception:  # pragma: no cover
-                    filename = frame_summary.f_code.co_filename
-                    if filename and not filename.startswith("<"):
-                        filename = os.path.abspath(filename) if filename else "?"
-                try:
-                    with open(filename, "rb") as op:
-                        source = op.read().decode("utf-8", errors="replace")
-                except Exception:  # pragma: no cover
-                    source = ""
+                co_filename = frame_summary.f_code.co_filename
+                filename = resolved_filenames.get(co_filename, None)
+                if filename is None:
+                    filename = _resolve_filename(frame_summary)
+                    resolved_filenames[co_filename] = filename
+                # linecache keeps the lines of each file around,
+                # frames from the same file don't read it again.
+                # (but the cache might be stale - e.g. inherited by a fork)
+                if filename not in checked_files:
+                    linecache.checkcache(filename)
+                    checked_files.add(filename)
+                lines = linecache.getlines(filename, frame_summary.f_globals)
+                source_start = max(line_no - _extra_lines, 0)
+                source_lines = [
+                    x.rstrip("\n")
+                    for x in lines[source_start : line_no + _extra_lines]
+                ]
                 # this needs to be 'robust'
                 # exceptions here tend to not leave a decent stack trace
                 my_locals = {}
                 for key, value in frame_summary.f_locals.items():
                     try:
-                        my_locals[key] = str(value)
+                        my_locals[key] = _str_local(value)
                     except Exception as e:
                         my_locals[key] = f"Could not str() local: {e}"
                 frame = Frame(
@@ -101,7 +145,8 @@ class Trace:
                     lineno=line_no,
                     name=frame_summary.f_code.co_name,
                     locals=my_locals,
-                    source=source,
+                    source_lines=source_lines,
+                    source_start=source_start,
                 )
                 append(frame)
 
@@ -188,19 +233,9 @@ class Trace:
                     # if frame.filename.startswith("<"): # pragma: no cover # - interactive, I suppose
                     # render_locals(frame)
                     # continue
-                    extra_lines = 3
-                    if frame.source:
-                        code = frame.source
-                        line_range = (
-                            frame.lineno - extra_lines,
-                            frame.lineno + extra_lines,
-                        )
-                        # leading empty lines get filtered from the output
-                        # but to actually show the correct section & highlight
-                        # we need to adjust the line range accordingly.
-                        code = code.split("\n")
-                        for ii, line in zip(
-                            range(*line_range), code[line_range[0] : line_range[1]]
+                    if frame.source_lines:
+                        for ii, line in enumerate(
+                            frame.source_lines, frame.source_start
                         ):
                             if ii == frame.lineno - 1:
                                 c = "> "
@@ -4,10 +4,10 @@ from . import exceptions
 import sys
 import os
 import json
-import queue
 import time
 import networkx
 from .util import escape_logging
+from . import util
 from .enums import (
     JobOutcome,
     RunMode,
@@ -27,14 +27,13 @@ from .util import (
     log_job_trace,
     console,
 )
-import copy
 from .job_status import RecordedJobOutcome
-from .history_comparisons import history_is_different
-from collections import deque
+from .history_comparisons import history_is_different, parse_history
+from collections import deque, defaultdict
 import signal
 import psutil
 import ctypes
-
+import weakref
 
 watcher_parent_pid = None
 watcher_ignored_processes = None
@@ -174,10 +173,16 @@ class Runner:
         with _with_changed_global_pipegraph(JobCollector(job_graph.run_mode)):
             self.job_graph = job_graph
             self.jobs = job_graph.jobs.copy()
-            self.job_inputs = copy.deepcopy(
-                job_graph.job_inputs
-            )  # job_graph.job_inputs.copy()
-            self.outputs_to_job_ids = job_graph.outputs_to_job_ids.copy()
+            # a snapshot - the graph's sets may be extended by jobs created
+            # during the run. frozensets are cheaper to build than
+            # a deepcopy, and make the snapshot read only.
+            self.job_inputs = defaultdict(
+                frozenset,
+                ((k, frozenset(v)) for (k, v) in job_graph.job_inputs.items()),
+            )
+            # no copy - jobs created during the run only add new outputs,
+            # they can't remap the ones our jobs depend on
+            self.outputs_to_job_ids = job_graph.outputs_to_job_ids
             self.next_job_number = self.job_graph.next_job_number
             self.core_lock = CoreLock(job_graph.cores)
             self.fail_counter = 0
@@ -186,9 +191,8 @@ class Runner:
                 run_id  # to allow jobgenerating jobs to run just once per graph.run()
             )
 
-            if not networkx.algorithms.is_directed_acyclic_graph(
-                self.job_graph.job_dag
-            ):  # pragma: no cover - defensive
+            topo = self.job_graph.topological_levels()
+            if topo is None:  # pragma: no cover - defensive
                 error_fn = (
                     self.job_graph.dir_config.log_dir / "debug_edges_with_cycles.txt"
                 )
@@ -225,56 +229,99 @@ class Runner:
                     f"Mismatch between len(self.jobs) {len(self.jobs)} - prune_counter {len(self.pruned)} and len(self.dag) {len(self.dag)}"
                 )
 
-            log_job_trace(
-                "dag "
-                + escape_logging(
-                    json.dumps(
-                        networkx.readwrite.json_graph.node_link_data(self.dag), indent=2
-                    )
-                ),
-            )
-
-            if not networkx.algorithms.is_directed_acyclic_graph(
-                self.dag
-            ):  # pragma: no cover - defensive
-                error_fn = (
-                    self.job_graph.dir_config.log_dir / "debug_edges_with_cycles.txt"
-                )
-                networkx.write_edgelist(self.dag, error_fn, delimiter="\t")
-                cycles = list(networkx.simple_cycles(self.dag))
-                raise exceptions.NotADag(
-                    f"Not a directed *acyclic* graph after modification. See {error_fn}. Cycles between {cycles}"
+            if util.do_jobtrace_log:
+                # serializing the whole dag is O(V+E) - only when it's logged
+                log_job_trace(
+                    "dag "
+                    + escape_logging(
+                        json.dumps(
+                            networkx.readwrite.json_graph.node_link_data(self.dag),
+                            indent=2,
+                        )
+                    ),
                 )
 
-            self.event_lock = threading.Lock()
-            self.jobs_to_run_que = queue.PriorityQueue()
+            # The pruned dag is a subgraph of an acyclic graph,
+            # so it is acyclic as well, and the topological order
+            # of job_dag restricted to it is it's topological order.
+            # It is fixed from here on - snapshot the upstreams once
+            # instead of walking networkx for every lookup
+            self.topological_order = [x for x in topo[0] if x in self.dag]
+            self.job_levels = {x: topo[1][x] for x in self.topological_order}
+            # (the adjacency views are plain dict lookups -
+            # cheaper than a predecessors() call per job)
+            pred = self.dag.pred
+            self.upstream_ids = {
+                job_id: tuple(pred[job_id]) for job_id in self.topological_order
+            }
+            self.run_priority = self._rank_by_critical_path()
+
             self.threads = []
-            self.jobs_that_need_propagation = deque()
             if jobs_do_dump_subgraph_debug:
                 j1 = self.jobs[list(jobs_do_dump_subgraph_debug)[0]]
                 j1.dump_subgraph_for_debug(
                     jobs_do_dump_subgraph_debug, self.jobs, self.dag
                 )
 
+    def _rank_by_critical_path(self):
+        """{job_id: rank} - lower ranks should be started first.
+
+        Jobs heading the longest chain of downstreams come first,
+        so long dependency chains get going while the short branches
+        fill the remaining cores (we have no reliable per job runtimes,
+        so every job counts as one).
+        Ties are broken by topological order, which also makes the order
+        deterministic - the evaluator hands out ready jobs from a hash set.
+        """
+        chain_length = dict.fromkeys(self.topological_order, 1)
+        for job_id in reversed(self.topological_order):
+            length = chain_length[job_id] + 1
+            for upstream_id in self.upstream_ids[job_id]:
+                if chain_length[upstream_id] < length:
+                    chain_length[upstream_id] = length
+        by_priority = sorted(
+            range(len(self.topological_order)),
+            key=lambda ii: -chain_length[self.topological_order[ii]],
+        )
+        return {self.topological_order[ii]: rank for rank, ii in enumerate(by_priority)}
+
     def _apply_pruning(self, dag, focus_on_these_jobs, jobs_already_run_previously):
-        def _recurse_pruning(job_id, reason):
+        succ = dag.succ
+        pred = dag.pred
+
+        # Iterative walks with a visited set - the recursive versions
+        # revisited shared downstreams/upstreams once per path, which
+        # explodes on diamond-heavy graphs (and hits the recursion limit
+        # on long chains). Revisiting never changes anything:
+        # the first prune_reason sticks, and unpruning is idempotent.
+        def _recurse_pruning(job_id, reason, visited):
             """This goes forward/downstream"""
-            pruned.add(job_id)
-            if not hasattr(self.jobs[job_id], "prune_reason"):
-                self.jobs[job_id].prune_reason = reason
-            for downstream_job_id in dag.successors(job_id):
-                _recurse_pruning(downstream_job_id, reason)
-
-        def _recurse_unpruning(job_id):
+            stack = [job_id]
+            while stack:
+                job_id = stack.pop()
+                if job_id in visited:
+                    continue
+                visited.add(job_id)
+                pruned.add(job_id)
+                if not hasattr(self.jobs[job_id], "prune_reason"):
+                    self.jobs[job_id].prune_reason = reason
+                stack.extend(succ[job_id])
+
+        def _recurse_unpruning(job_id, visited):
             """This goes upstream"""
-            # log_job_trace(f"_recurse_unpruning {job_id}")
-            try:
-                pruned.remove(job_id)
-                del self.jobs[job_id].prune_reason
-            except (KeyError, AttributeError):
-                pass
-            for downstream_job_id in dag.predecessors(job_id):
-                _recurse_unpruning(downstream_job_id)
+            stack = [job_id]
+            while stack:
+                job_id = stack.pop()
+                if job_id in visited:
+                    continue
+                visited.add(job_id)
+                # log_job_trace(f"_recurse_unpruning {job_id}")
+                try:
+                    pruned.remove(job_id)
+                    del self.jobs[job_id].prune_reason
+                except (KeyError, AttributeError):
+                    pass
+                stack.extend(pred[job_id])
 
         if jobs_already_run_previously:
             new_jobs = set(dag.nodes).difference(jobs_already_run_previously)
@@ -288,8 +335,9 @@ class Runner:
             # then unprune this one and it's predecessors
             pruned.update(set(dag.nodes))  # prune all...
             focus_job_ids = set((x.job_id for x in focus_on_these_jobs))
+            unpruned = set()
             for job_id in focus_job_ids.union(new_jobs):
-                _recurse_unpruning(job_id)
+                _recurse_unpruning(job_id, unpruned)
         else:
             focus_job_ids = set()
 
@@ -297,17 +345,21 @@ class Runner:
         if jobs_already_run_previously:
             pruned.update(jobs_already_run_previously)
 
+        visited = set()
         for job_id in self.jobs:
             if self.jobs[job_id]._pruned:
                 if not job_id in focus_job_ids:
-                    log_job_trace(f"pruning because of _pruned {job_id}")
-                    _recurse_pruning(job_id, job_id)
+                    if util.do_jobtrace_log:
+                        log_job_trace(f"pruning because of _pruned {job_id}")
+                    _recurse_pruning(job_id, job_id, visited)
 
+        unpruned = set()
         for job_id in new_jobs:
-            _recurse_unpruning(job_id)
+            _recurse_unpruning(job_id, unpruned)
 
         for job_id in pruned:
-            log_job_trace(f"pruned {job_id}")
+            if util.do_jobtrace_log:
+                log_job_trace(f"pruned {job_id}")
             try:
                 dag.remove_node(job_id)
             except (
@@ -352,7 +404,15 @@ class Runner:
 
     def compare_history(self, job_id_from, job_id_to, last_value, new_value):
         # called from rust
-        return history_is_different(self, job_id_from, job_id_to, last_value, new_value)
+        # compare_hashes is pure, so the answer can't change within a run
+        key = (job_id_from, job_id_to, last_value, new_value)
+        try:
+            return self.compare_history_cache[key]
+        except KeyError:
+            res = self.compare_history_cache[key] = history_is_different(
+                self, job_id_from, job_id_to, last_value, new_value
+            )
+            return res
 
     @staticmethod
     def get_job_inputs_str(job_graph, job_id):
@@ -363,19 +423,26 @@ class Runner:
     def build_evaluator(self, history):
         from .pypipegraph2 import PPG2Evaluator
 
+        # The (rust) evaluator is not visible to python's cycle collector,
+        # so callbacks holding on to self would keep every Runner
+        # (and with it all jobs and the history) alive forever.
+        runner_ref = weakref.ref(self)
+        job_graph = self.job_graph
         e = PPG2Evaluator(
             history,
-            self.compare_history,
-            lambda job_id: self.__class__.get_job_inputs_str(self.job_graph, job_id),
+            lambda *args: runner_ref().compare_history(*args),
+            lambda job_id: Runner.get_job_inputs_str(job_graph, job_id),
         )
         # todo: see how much we can push into rust of
         # the whole networkx business.
         # no need to keep multiple graphs, I suppose.
-        for job_id in self.dag.nodes:
-            job = self.jobs[job_id]
-            e.add_node(job_id, job.eval_job_kind)
-        for a, b in self.dag.edges:
-            e.add_edge(b, a)
+        # upstream_ids is in topological order - every upstream has been
+        # added by the time we add its edges, so one pass suffices.
+        # (per node edge order is the same as adding all nodes first)
+        for job_id, upstream_ids in self.upstream_ids.items():
+            e.add_node(job_id, self.jobs[job_id].eval_job_kind)
+            for upstream_id in upstream_ids:
+                e.add_edge(job_id, upstream_id)
         return e
 
     def run(self, history, last_job_states, print_failures):  # noqa:C901
@@ -398,13 +465,25 @@ class Runner:
 
         self.history = history  # so the jobs can peak at it and avoid reprocessing
 
+        self.compare_history_cache = {}
+        self.parsed_history_cache = {}
+        self.edge_outputs_cache = {}
         self.evaluator = self.build_evaluator(history)
         self.evaluator_lock = threading.Lock()
         self.evaluator.event_startup()
         self.evaluation_done = threading.Event()
         self.check_for_new_jobs = threading.Event()
 
-        self.jobs_in_flight = []
+        # a set - jobs finish in any order, list.remove was O(n).
+        # Other threads (interactive) iterate over list(jobs_in_flight),
+        # which copies atomically.
+        self.jobs_in_flight = set()
+        # job_ids in flight that still wait for their cores.
+        # Kept up to date alongside job.waiting, so a status report
+        # doesn't have to rescan jobs_in_flight on every job start.
+        # (set.add/discard are atomic, the threads don't need a lock)
+        self.jobs_waiting = set()
+        self.jobs_ready = deque()  # cache of evaluator.jobs_ready_to_run()
         self.jobs_all_cores_in_flight = 0
         self.job_outcomes = {}
 
@@ -457,10 +536,12 @@ class Runner:
             self.job_outcomes[job_id] = RecordedJobOutcome(
                 job_id, JobOutcome.Pruned, None
             )
-            ljt(f"Logging as pruned {job_id}")
+            if util.do_jobtrace_log:
+                ljt(f"Logging as pruned {job_id}")
 
         for job_id in self.evaluator.list_upstream_failed_jobs():
-            ljt(f"upstream failed {job_id}")
+            if util.do_jobtrace_log:
+                ljt(f"upstream failed {job_id}")
             if job_id in self.job_outcomes:
                 raise ValueError("Upstream Failed & having other outcome?!")
             self.job_outcomes[job_id] = RecordedJobOutcome(
@@ -508,13 +589,7 @@ class Runner:
                 # t - self.last_status_time >= 0.5  # don't update more than every half second.
                 True
             ):
-                waiting = len(
-                    [
-                        x
-                        for x in self.jobs_in_flight
-                        if getattr(self.jobs[x], "waiting", False)
-                    ]
-                )
+                waiting = len(self.jobs_waiting)
                 self.interactive.report_status(
                     StatusReport(
                         len(self.jobs_in_flight) - waiting,
@@ -559,9 +634,10 @@ class Runner:
         res = (
             self.last_job_states
             and job_id in self.last_job_states
-            and self.last_job_states[job_id].outcome == JobOutcome.Failed
+            and self.last_job_states[job_id].outcome is JobOutcome.Failed
         )
-        log_trace(f"_job_failed_last_time: {job_id}: {res}")
+        if util.do_jobtrace_log:
+            log_trace(f"_job_failed_last_time: {job_id}: {res}")
         return res
 
     def _start_another_thread(self):
@@ -618,7 +694,7 @@ class Runner:
                             f"Runtime until failure: {job.stop_time - job.start_time:.2f}s\n"
                         )
                         ef.write("Input jobs:\n")
-                        for parent_id in sorted(self.dag.predecessors(job_id)):
+                        for parent_id in sorted(self.upstream_ids[job_id]):
                             ef.write(
                                 f"\t{parent_id} ({self.jobs[parent_id].__class__.__name__})\n"
                             )
@@ -704,9 +780,20 @@ class Runner:
                                 except Exception as e:
                                     log_error(f"Cleanup had an exception {repr(e)}")
                                 self.evaluator.event_job_cleanup_done(cleanup_job_id)
-
-                            rr = self.evaluator.jobs_ready_to_run()
-                            if not rr:
+                            if cleanups:
+                                self.jobs_ready.clear()
+
+                            # jobs_ready_to_run() returns *all* ready jobs.
+                            # Ask once per evaluator state change,
+                            # not once per job we start.
+                            if not self.jobs_ready:
+                                self.jobs_ready.extend(
+                                    sorted(
+                                        self.evaluator.jobs_ready_to_run(),
+                                        key=self.run_priority.__getitem__,
+                                    )
+                                )
+                            if not self.jobs_ready:
                                 if self.evaluator.is_finished():
                                     # ljt("detected finished")
                                     self.stopped = True
@@ -751,14 +838,16 @@ class Runner:
                                             self.interactive._cmd_die(False)
 
                             else:
-                                ljt(f"to run {rr}")
-                                job_id = rr[0]
-                                self.jobs_in_flight.append(job_id)
+                                job_id = self.jobs_ready.popleft()
+                                if util.do_jobtrace_log:
+                                    ljt(f"to run {job_id}")
+                                self.jobs_in_flight.add(job_id)
                                 # ljt(f"added {job_id} {self.jobs_in_flight}")
                                 self.evaluator.event_now_running(job_id)
 
                                 job = self.jobs[job_id]
                                 job.waiting = True
+                                self.jobs_waiting.add(job_id)
                                 job.actual_cores_needed = -1
                                 self._interactive_report()
                                 job.start_time = (
@@ -816,8 +905,10 @@ class Runner:
                             job.start_time = time.time()  # the *actual* start time
                             log_info(f"Job started : '{job_id}'")
                             job.waiting = False
+                            self.jobs_waiting.discard(job_id)
                             self._interactive_report()
-                            ljt(f"Go {job_id}")
+                            if util.do_jobtrace_log:
+                                ljt(f"Go {job_id}")
 
                             try:
                                 # that's history-output
@@ -825,8 +916,9 @@ class Runner:
                                     job_id, None
                                 )
                                 if old_history_for_this_job is not None:
-                                    old_history_for_this_job = json.loads(
-                                        old_history_for_this_job
+                                    # shared with the history comparisons - read only!
+                                    old_history_for_this_job = parse_history(
+                                        self, old_history_for_this_job
                                     )
                                 else:
                                     old_history_for_this_job = {}
@@ -894,9 +986,9 @@ class Runner:
                                         "Aborted", KeyboardInterrupt()
                                     )
                                     # raise ValueError("Should not happen")
-                                if outputs is not None and set(outputs.keys()) != set(
+                                if outputs is not None and outputs.keys() != set(
                                     self.jobs[job_id].outputs
-                                ):  # the 2nd one is a list...
+                                ):  # the 2nd one is a list, keys() compares like a set
                                     log_trace(
                                         f"\t{job_id} returned the wrong set of outputs. "
                                         f"Should be {escape_logging(str(set(self.jobs[job_id].outputs)))}, was {escape_logging(str(set(outputs.keys())))}"
@@ -915,7 +1007,10 @@ class Runner:
                                     str_history = json.dumps(
                                         outputs, sort_keys=True, indent=1
                                     )
-                                    ljt(f"success {job_id} str_history {str_history}")
+                                    if util.do_jobtrace_log:
+                                        ljt(
+                                            f"success {job_id} str_history {str_history}"
+                                        )
                                     finish_msg = f"Job finished: '{job_id}'. Runtime: {job.stop_time - job.start_time:.2f}s"
                                     if (job.stop_time != job.stop_time) or (
                                         job.stop_time - job.start_time > 1
@@ -926,6 +1021,7 @@ class Runner:
                                     self.done_counter += 1
                                     self._interactive_report()
                                     try:
+                                        self.jobs_ready.clear()
                                         self.evaluator.event_job_success(
                                             job_id, str_history
                                         )
@@ -941,10 +1037,12 @@ class Runner:
                                 else:
                                     self.fail_counter += 1
                                     self._interactive_report()
-                                    ljt(f"failure {job_id} - {error}")
+                                    if util.do_jobtrace_log:
+                                        ljt(f"failure {job_id} - {error}")
                                     self.job_outcomes[job_id] = RecordedJobOutcome(
                                         job_id, JobOutcome.Failed, error
                                     )
+                                    self.jobs_ready.clear()
                                     self.evaluator.event_job_failure(job_id)
                                     try:
                                         self.log_failed_job(job_id, error)
@@ -952,7 +1050,7 @@ class Runner:
                                         log_error(
                                             f"logging job failure failed {job_id} {e}"
                                         )
-                                self.jobs_in_flight.remove(job_id)
+                                self.jobs_in_flight.discard(job_id)
                                 if c > 1:
                                     self.jobs_all_cores_in_flight -= 1
 
@@ -1,5 +1,6 @@
 import os
 import sys
+import collections
 from loguru import logger
 from rich.console import Console
 from . import ppg_traceback
@@ -9,7 +10,9 @@ if "pytest" in sys.modules:
     console_args["width"] = 120
 console = Console(**console_args)
 
-cpu_count = None
+# os.cpu_count() does what the sysconf / NUMBER_OF_PROCESSORS dance
+# cribbed from pp did by hand (and works on MacOS, os.popen2 is long gone).
+cpu_count = os.cpu_count() or 1
 
 
 def escape_logging(s):
@@ -18,27 +21,8 @@ def escape_logging(s):
 
 def CPUs():
     """
-    Detects the number of CPUs on a system. Cribbed from pp.
+    Detects the number of CPUs on a system.
     """
-    global cpu_count
-    if cpu_count is None:
-        cpu_count = 1  # default
-        # Linux, Unix and MacOS:
-        if hasattr(os, "sysconf"):
-            if "SC_NPROCESSORS_ONLN" in os.sysconf_names:
-                # Linux & Unix:
-                ncpus = os.sysconf("SC_NPROCESSORS_ONLN")
-                if isinstance(ncpus, int) and ncpus > 0:
-                    cpu_count = ncpus
-            else:  # OSX: pragma: no cover
-                cpu_count = int(
-                    os.popen2("sysctl -n hw.ncpu")[1].read()
-                )  # pragma: no cover
-        # Windows:
-        if "NUMBER_OF_PROCESSORS" in os.environ:  # pragma: no cover
-            ncpus = int(os.environ["NUMBER_OF_PROCESSORS"])
-            if ncpus > 0:
-                cpu_count = ncpus
     return cpu_count
 
 
@@ -84,7 +68,8 @@ def assert_uniqueness_of_object(
 
         pipegraph = global_pipegraph
 
-    if object_with_name_attribute.name.find("/") != -1:
+    name = object_with_name_attribute.name
+    if "/" in name:
         raise ValueError(
             "Names must not contain /, it confuses the directory calculations"
         )
@@ -93,27 +78,18 @@ def assert_uniqueness_of_object(
     if not hasattr(pipegraph, "object_uniquifier"):
         pipegraph.object_uniquifier = {}
     typ = object_with_name_attribute.__class__
-    if typ not in pipegraph.object_uniquifier:
-        pipegraph.object_uniquifier[typ] = {}
-    if object_with_name_attribute.name in pipegraph.object_uniquifier[typ]:
-        raise ValueError(
-            "Doublicate object: %s, %s" % (typ, object_with_name_attribute.name)
-        )
+    # {class: set of names}
+    seen = pipegraph.object_uniquifier.setdefault(typ, set())
+    if name in seen:
+        raise ValueError("Doublicate object: %s, %s" % (typ, name))
     if also_check:
         if not isinstance(also_check, list):
             also_check = [also_check]
         for other_typ in also_check:
-            if (
-                other_typ in pipegraph.object_uniquifier
-                and object_with_name_attribute.name
-                in pipegraph.object_uniquifier[other_typ]
-            ):
-                raise ValueError(
-                    "Doublicate object: %s, %s"
-                    % (other_typ, object_with_name_attribute.name)
-                )
-    object_with_name_attribute.unique_id = len(pipegraph.object_uniquifier[typ])
-    pipegraph.object_uniquifier[typ][object_with_name_attribute.name] = True
+            if name in pipegraph.object_uniquifier.get(other_typ, ()):
+                raise ValueError("Doublicate object: %s, %s" % (other_typ, name))
+    object_with_name_attribute.unique_id = len(seen)
+    seen.add(name)
 
 
 def flatten_jobs(j):
@@ -121,11 +97,75 @@ def flatten_jobs(j):
     and return just the jobs"""
     from .jobs import Job
 
-    if isinstance(j, Job):
-        yield j
-    else:
-        for sj in j:
-            yield from flatten_jobs(sj)
+    # a stack of iterators instead of recursion - keeps the order,
+    # works with any iterable and doesn't nest generators
+    stack = [iter((j,))]
+    while stack:
+        for sj in stack[-1]:
+            if isinstance(sj, Job):
+                yield sj
+            elif isinstance(sj, str):
+                # iterating a str yields strs - this would never end
+                raise TypeError(f"Expected jobs or lists of jobs, got {sj!r}")
+            else:
+                stack.append(iter(sj))
+                break
+        else:
+            stack.pop()
+
+
+def dag_to_csr(dag):
+    """Flatten a networkx.DiGraph into integer (CSR) adjacency lists.
+
+    Returns (node_ids, indptr, indices) - the successors
+    of node_ids[i] are indices[indptr[i]:indptr[i+1]].
+    """
+    node_ids = list(dag.nodes)
+    idx = {node_id: ii for (ii, node_id) in enumerate(node_ids)}
+    adj = dag.adj
+    indptr = [0]
+    indices = []
+    for node_id in node_ids:
+        indices.extend([idx[x] for x in adj[node_id]])
+        indptr.append(len(indices))
+    return node_ids, indptr, indices
+
+
+def topological_levels(dag):
+    """Kahn's algorithm on the flattened adjacency.
+    Much cheaper than networkx' dict-of-dict walking on large graphs.
+
+    Returns (order, levels) - the node ids in topological order,
+    and {node_id: longest distance from a source node}.
+    Returns None if the graph contains a cycle.
+    """
+    node_ids, indptr, indices = dag_to_csr(dag)
+    indegree = [0] * len(node_ids)
+    for ii in indices:
+        indegree[ii] += 1
+    level = [0] * len(node_ids)
+    todo = collections.deque(ii for (ii, d) in enumerate(indegree) if d == 0)
+    order = []
+    while todo:
+        ii = todo.popleft()
+        order.append(ii)
+        next_level = level[ii] + 1
+        for jj in indices[indptr[ii] : indptr[ii + 1]]:
+            if level[jj] < next_level:
+                level[jj] = next_level
+            indegree[jj] -= 1
+            if indegree[jj] == 0:
+                todo.append(jj)
+    if len(order) != len(node_ids):
+        return None
+    return (
+        [node_ids[ii] for ii in order],
+        {node_ids[ii]: level[ii] for ii in order},
+    )
+
+
+def is_acyclic(dag):
+    return topological_levels(dag) is not None
 
 
 do_jobtrace_log = False
@@ -883,6 +883,22 @@ class TestPypipegraph2:
         assert info["B"].outcome is JobOutcome.Skipped
         assert read("B") == "hello"
 
+    def test_replaced_file_with_same_mtime_and_size_triggers_recalc_of_hash(self):
+        import os
+
+        write("A", "hello")
+        fi = ppg.FileInvariant("A")
+        of = ppg.FileGeneratingJob("B", lambda of: write(of, read("A")))
+        of.depends_on(fi)
+        ppg.run()
+        stat = os.stat("A")
+        write("A2", "world")
+        os.utime("A2", ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        os.replace("A2", "A")  # atomic replace -> new inode
+        ppg.run()
+        assert fi.did_hash_last_run
+        assert read("B") == "world"
+
     def test_same_mtime_same_size_leads_to_false_negative(self):
         import datetime
         import time
@@ -962,6 +978,44 @@ class TestPypipegraph2:
         ppg.run()
         assert Path("b").read_text() == "3"  # hey, we lost one!
 
+    def test_readd_keeps_the_function_invariant(self):
+        jobB = ppg.FileGeneratingJob(
+            "B", lambda of: counter("b") and of.write_text("B")
+        )
+        fi = jobB.func_invariant
+        ppg.run()
+        assert Path("b").read_text() == "1"
+        ppg.new()
+        jobB.readd()
+        assert jobB.func_invariant is fi
+        assert ppg.global_pipegraph.jobs[fi.job_id] is fi
+        ppg.run()
+        assert Path("b").read_text() == "1"
+
+    def test_jobs_heading_long_chains_run_first(self):
+        ppg.new(cores=1)
+
+        def log(name):
+            with open("order", "a") as op:
+                op.write(name)
+
+        ppg.FileGeneratingJob(
+            "A", lambda of: log("A") or of.write_text("A"), depend_on_function=False
+        )
+        chain = [
+            ppg.FileGeneratingJob(
+                name,
+                lambda of: log(of.name) or of.write_text(of.name),
+                depend_on_function=False,
+            )
+            for name in "BCD"
+        ]
+        chain[1].depends_on(chain[0])
+        chain[2].depends_on(chain[1])
+        ppg.run()
+        # A and D both end a chain of length one - after that it's topological
+        assert Path("order").read_text()[:2] == "BC"
+
     def test_function_invariant_binding_parameter(self):
         params = ["a"]
         jobB = ppg.FileGeneratingJob(
@@ -49,3 +49,15 @@ class TestCycles:
 
         with pytest.raises(ppg.exceptions.NotADag):
             ppg.run()
+
+    def test_cycle_added_after_a_run(self):
+        jobA = ppg.FileGeneratingJob("A", lambda of: write("A", "A"))
+        jobB = ppg.FileGeneratingJob("B", lambda of: write("B", "A"))
+        jobC = ppg.FileGeneratingJob("C", lambda of: write("C", "A"))
+        jobC.depends_on(jobB)
+        jobB.depends_on(jobA)
+        ppg.run()
+        jobA.depends_on(jobC)
+
+        with pytest.raises(ppg.exceptions.NotADag):
+            ppg.run()
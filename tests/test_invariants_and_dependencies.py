@@ -154,6 +154,16 @@ class TestInvariant:
         with pytest.raises(ValueError):
             ppg.ParameterInvariant("a", (1, 2, 4))
 
+    def test_parameter_invariant_atomic_values_keep_their_type(self):
+        ppg.ParameterInvariant("a", 1)
+        with pytest.raises(ValueError):
+            ppg.ParameterInvariant("a", True)
+        with pytest.raises(ValueError):
+            ppg.ParameterInvariant("a", "1")
+        assert ppg.ParameterInvariant.freeze(0.0) != ppg.ParameterInvariant.freeze(
+            -0.0
+        )
+
     def test_filetime_dependency(self):
         of = "out/a"
 
@@ -1021,10 +1031,53 @@ class TestFunctionInvariant:
         calc = a.run(None, None)
         changed = calc.copy()
         changed["FIa"]["source_file"]["mtime"] = -1
+        changed["FIa"]["source_file"]["mtime_ns"] = -1
         changed["FIa"]["source_file"]["dis"] = "find me"
         calc2 = a.run(None, changed)
         assert calc2["FIa"]["source_file"]["dis"] == "find me"
 
+    def test_closure_cells_are_cached(self):
+        def gen():
+            x = {"a": 1}
+
+            def a():
+                return x
+
+            def b():
+                return x
+
+            def set_x(value):
+                nonlocal x
+                x = value
+
+            return a, b, set_x
+
+        a, b, set_x = gen()
+        extract_closure = ppg.jobs._FunctionInvariant.extract_closure
+        cache = {}
+        assert extract_closure(a, cache) == extract_closure(a)
+        assert len(cache) == 1
+        assert extract_closure(b, cache) == extract_closure(a)
+        assert len(cache) == 1
+        set_x({"a": 2})
+        assert extract_closure(b, cache) == "\n[('a', 2)]"
+
+    def test_large_closure_dicts_are_digested(self):
+        def gen(x):
+            def inner():
+                return x
+
+            return inner
+
+        extract_closure = ppg.jobs._FunctionInvariant.extract_closure
+        large = {ii: str(ii) for ii in range(100)}
+        a = extract_closure(gen(large))
+        assert len(a) < 100
+        assert a == extract_closure(gen(dict(reversed(large.items()))))
+        assert a != extract_closure(gen({**large, 50: "x"}))
+        assert a != extract_closure(gen(set(large)))
+        assert extract_closure(gen({1: 2})) == "\n[(1, 2)]"
+
 
 @pytest.mark.usefixtures("create_out_dir")
 @pytest.mark.usefixtures("ppg2_per_test")
@@ -1437,3 +1490,44 @@ class TestFunctionInvariantDisChanges_BetweenVersions:
         assert ppg.FunctionInvariant.compare_hashes(None, (av), (bv))
         assert ppg.FunctionInvariant.compare_hashes(None, (cv), (dv))
         assert not ppg.FunctionInvariant.compare_hashes(None, (av), (cv))
+
+    def test_dis_text_history_is_not_invalidated(self):
+        captured = 55
+
+        def test():
+            return captured
+
+        a = ppg.FunctionInvariant("a", test)
+        av = first_value(a.run(None, None))
+        old = av.copy()
+        old[ppg.jobs.python_version] = (
+            ((a.dis_code(test.__code__, test),),),
+            a.extract_closure(test),
+        )
+        assert ppg.FunctionInvariant.compare_hashes(None, old, av)
+        old["source"] = "(): return 56"
+        assert not ppg.FunctionInvariant.compare_hashes(None, old, av)
+        old["source"] = av["source"]
+        old[ppg.jobs.python_version] = (
+            old[ppg.jobs.python_version][0],
+            "\n56",
+        )
+        assert not ppg.FunctionInvariant.compare_hashes(None, old, av)
+
+    def test_dis_text_history_is_not_reused(self):
+        captured = 55
+
+        def test():
+            return captured
+
+        a = ppg.FunctionInvariant("a", test)
+        av = first_value(a.run(None, None))
+        old = av.copy()
+        old[ppg.jobs.python_version] = (
+            ((a.dis_code(test.__code__, test),),),
+            a.extract_closure(test),
+        )
+        # source file unchanged - but the history has no fingerprint to reuse
+        bv = first_value(a.run(None, {a.job_id: old}))
+        assert bv[ppg.jobs.python_version] == av[ppg.jobs.python_version]
+        assert ppg.FunctionInvariant.compare_hashes(None, old, bv)
@@ -432,6 +432,19 @@ class TestFileGeneratingJob:
         assert job.stdout == "stdout is cool\n"
         assert job.stderr == "I am stderr\n"  # no \n here
 
+    def test_simple_filegeneration_captures_non_utf8_output(self):
+        of = "out/a"
+
+        def do_write(of):
+            import subprocess
+
+            subprocess.check_call("printf 'bad \\377 byte'", shell=True)
+            of.write_text("hello")
+
+        job = ppg.FileGeneratingJob(of, do_write)
+        ppg.run()
+        assert job.stdout == "bad \ufffd byte"
+
     def test_simple_filegeneration_disabled_stdout_capture(self):
         of = "out/a"
         data_to_write = "hello"
@@ -99,6 +99,27 @@ class CantDepickle:
 
 @pytest.mark.usefixtures("ppg2_per_test")
 class TestingTheUnexpectedTests:
+    def test_runner_is_garbage_collected(self):
+        import gc
+        import weakref
+
+        ppg.FileGeneratingJob("A", lambda of: of.write_text("A"))
+        runners = []
+        org_init = ppg.runner.Runner.__init__
+
+        def record(self, *args, **kwargs):
+            runners.append(weakref.ref(self))
+            org_init(self, *args, **kwargs)
+
+        ppg.runner.Runner.__init__ = record
+        try:
+            ppg.run()
+        finally:
+            ppg.runner.Runner.__init__ = org_init
+        gc.collect()
+        assert len(runners) == 1
+        assert runners[0]() is None
+
     def test_job_exiting_python(self):
         def dies(of):
             import sys
@@ -272,6 +293,34 @@ class TestPathLib:
         assert not (Path("i").exists())
         assert not (Path("j").exists())
 
+    def test_symlinks_are_resolved(self):
+        Path("real").mkdir()
+        Path("linked").symlink_to("real")
+        write("real/target", "hello")
+        Path("real/link").symlink_to("target")
+        a = ppg.FileInvariant("linked/target")
+        assert a.job_id == "real/target"
+        b = ppg.FileInvariant("real/link")
+        assert b is a
+        c = ppg.FileGeneratingJob("linked/other", lambda of: of.write_text("c"))
+        assert c.job_id == "real/other"
+
+    def test_missing_files(self):
+        from pypipegraph2.jobs import _missing_files
+
+        Path("many").mkdir()
+        files = [Path("many") / str(ii) for ii in range(40)]
+        for f in files[:30]:
+            f.write_text("x")
+        Path("many/dangling").symlink_to("does_not_exist")
+        Path("many/link").symlink_to("0")
+        files.extend([Path("many/dangling"), Path("many/link"), Path("nope/a")])
+        assert _missing_files(files) == set(files[30:40]) | {
+            Path("many/dangling"),
+            Path("nope/a"),
+        }
+        assert _missing_files(files[:3]) == set()
+
 
 def test_fixture_without_class(ppg2_per_test):
     # just to make sure the ppg2_per_test fixture does what it's supposed to if you're not using a class
@@ -362,6 +411,22 @@ def test_capturing_locals_when_they_have_throwing_str(ppg2_per_test):
     assert "trace check" in str(j.stack_trace)  # we captured teh relevant line
 
 
+def test_captured_locals_are_bounded():
+    def inner():
+        huge = list(range(100000))  # noqa: F841
+        text = "x" * 100000  # noqa: F841
+        raise ValueError()
+
+    try:
+        inner()
+    except ValueError:
+        trace = ppg.ppg_traceback.Trace(*sys.exc_info())
+    frame = trace.stacks[0].frames[-1]
+    assert frame.locals["huge"].startswith("[0, 1, 2")
+    assert len(frame.locals["huge"]) < 1000
+    assert len(frame.locals["text"]) == 1001
+
+
 class TestCleanup:
     def test_error_cleanup(self, ppg2_per_test):
         import pypipegraph2 as ppg2
@@ -609,6 +674,18 @@ def test_calling_function_difference():
     )
 
 
+def test_calling_function_difference_code():
+    def a():
+        return 5
+
+    def b():
+        return 6
+
+    r = ppg.FunctionInvariant.debug_function_differences(a, b)
+    assert r.startswith("The function __code__ differed")
+    assert "-RETURN_CONST\t5" in r or "-LOAD_CONST\t5" in r
+
+
 def test_spawned_processes_get_killed_on_abort(ppg2_per_test, job_trace_log):
     import psutil
 
@@ -695,3 +772,12 @@ def test_tempmultifilegen_changing_output_but_had_been_validated(ppg2_per_test):
         ppg.run()
     error = ppg.global_pipegraph.last_run_result[tmfg.job_id].error
     assert "changed output" in error and "ephemeral" in error.lower()
+
+
+def test_hash_file_mmap_matches_read(tmp_path, monkeypatch):
+    fn = tmp_path / "large"
+    fn.write_bytes(os.urandom(1024 * 1024 * 3 + 17))
+    read_hash = ppg.hashers.hash_file(fn)
+    monkeypatch.setattr(ppg.hashers, "_mmap_threshold", 1024)
+    monkeypatch.setattr(ppg.hashers, "_mmap_block_size", 1024 * 1024)
+    assert ppg.hashers.hash_file(fn) == read_hash
@@ -1,3 +1,4 @@
+import sys
 import pytest
 import pypipegraph2 as ppg
 
@@ -118,6 +119,28 @@ class TestUtils:
         res = [j1, [j2, [j3, j1]]]
         # no dedup on this.
         assert list(ppg.util.flatten_jobs(res)) == [j1, j2, j3, j1]
+        deep = j1
+        for _ in range(sys.getrecursionlimit() + 10):
+            deep = [deep]
+        assert list(ppg.util.flatten_jobs((x for x in [deep, (j2,)]))) == [j1, j2]
+        with pytest.raises(TypeError):
+            list(ppg.util.flatten_jobs([j1, ["A"]]))
+
+    def test_topological_levels(self):
+        import networkx
+
+        dag = networkx.DiGraph()
+        dag.add_edge("a", "b")
+        dag.add_edge("b", "c")
+        dag.add_edge("a", "c")
+        dag.add_node("d")
+        order, levels = ppg.util.topological_levels(dag)
+        assert order.index("a") < order.index("b") < order.index("c")
+        assert levels == {"a": 0, "b": 1, "c": 2, "d": 0}
+        assert ppg.util.is_acyclic(dag)
+        dag.add_edge("c", "a")
+        assert ppg.util.topological_levels(dag) is None
+        assert not ppg.util.is_acyclic(dag)
 
     def test_inside_ppg(self):
         assert ppg.global_pipegraph is not None